@@ -0,0 +1,451 @@
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+
+import backend
+import dataset
+import geostore
+import versions
+
+# API HTTP locale, sans Streamlit, sur le même dataset partagé que l'app
+# (même backend, même version, même bascule à chaud) :
+#
+#   GET /features?categorie=Jardin,Square&arrondissement=12e&ouverture_24h=oui
+#                &cloture=non&annee_max=1900&bbox=2.3,48.8,2.4,48.9&limit=100&offset=0
+#   GET /stats?<mêmes filtres>
+#   GET /nearest?lon=2.35&lat=48.85&k=5&<mêmes filtres>
+#   GET /version
+#
+# Réponses JSON. L'ETag ne dépend que de la version du dataset et de la requête :
+# un client qui revalide (If-None-Match) reçoit un 304 sans aucun calcul. Les
+# réponses sont gardées en mémoire (déjà encodées et compressées) par
+# (version, requête) ; gzip si le client l'accepte.
+#
+#   python api.py --port 8502
+#   python api.py --bench --concurrency 16 --requests 2000
+API_HOST = os.environ.get("EV_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("EV_API_PORT", "8502"))
+
+CACHE_ENTRIES = int(os.environ.get("EV_API_CACHE", "512"))
+GZIP_MIN_BYTES = 1024
+MAX_LIMIT = 1000
+DEFAULT_LIMIT = 100
+MAX_NEAREST = 50
+
+FEATURE_COLS = [
+    "nom",
+    "categorie",
+    "arrondissement_affiche",
+    backend.SURFACE_COL,
+    "annee_ouverture",
+    "ouverture_24h",
+    "presence_cloture",
+]
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# =========================
+# Paramètres
+# =========================
+LIST_PARAMS = ["categorie", "arrondissement"]
+
+
+def _values(params, name):
+    # ?categorie=Jardin&categorie=Square ou ?categorie=Jardin,Square
+    return sorted({v.strip() for raw in params.get(name, []) for v in raw.split(",") if v.strip()})
+
+
+def _one(params, name):
+    values = params.get(name)
+    return values[-1].strip() if values else None
+
+
+def _bool(params, name):
+    value = _one(params, name)
+    if value is None or value.lower() in ("", "tous"):
+        return None
+    if value.lower() in ("oui", "true", "1"):
+        return True
+    if value.lower() in ("non", "false", "0"):
+        return False
+    raise ApiError(f"{name} : oui / non attendu, reçu {value!r}")
+
+
+def _number(params, name, kind=float, default=None, lo=None, hi=None):
+    value = _one(params, name)
+    if value is None or value == "":
+        return default
+    try:
+        value = kind(value)
+    except ValueError:
+        raise ApiError(f"{name} : nombre attendu, reçu {value!r}")
+    if not math.isfinite(value):
+        # nan / inf passeraient les bornes et donneraient un JSON invalide
+        raise ApiError(f"{name} : nombre fini attendu, reçu {value!r}")
+    if (lo is not None and value < lo) or (hi is not None and value > hi):
+        raise ApiError(f"{name} : valeur hors de [{lo}, {hi}]")
+    return value
+
+
+def parse_filters(params):
+    # mêmes filtres que la carte typologique (+ année max et emprise)
+    filters = {
+        "categories": _values(params, "categorie"),
+        "arrondissements": _values(params, "arrondissement"),
+        "ouverture_24h": _bool(params, "ouverture_24h"),
+        "presence_cloture": _bool(params, "cloture"),
+        "year_max": _number(params, "annee_max", int),
+    }
+    bbox = _one(params, "bbox")
+    if bbox:
+        try:
+            bbox = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4 or not all(math.isfinite(v) for v in bbox):
+            raise ApiError("bbox : lon_min,lat_min,lon_max,lat_max attendu")
+        filters["bbox"] = bbox
+    return filters
+
+
+# =========================
+# Routes
+# =========================
+def get_features(be, params):
+    filters = parse_filters(params)
+    limit = _number(params, "limit", int, DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = _number(params, "offset", int, 0, 0)
+
+    # seuls les espaces avec un polygone sont des features GeoJSON
+    total = be.count(has_geometry=True, **filters)
+    df = be.page(offset, limit, FEATURE_COLS + ["geometry"], has_geometry=True, **filters)
+    features = []
+    for record in dataset.json_records(df):
+        geometry = record.pop("geometry")
+        features.append({"type": "Feature", "id": record["row_id"], "properties": record, "geometry": geometry})
+    return {
+        "type": "FeatureCollection",
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "features": features,
+    }
+
+
+def get_stats(be, params):
+    filters = parse_filters(params)
+    df = be.select(["categorie", "arrondissement_affiche", backend.SURFACE_COL], **filters)
+
+    # surface par catégorie sans double compte (cf. overlaps.py), comme l'onglet Stats
+    categories = []
+    for cat, n in df["categorie"].value_counts().sort_index().items():
+        surface = be.total_surface(**{**filters, "categories": [cat]})
+        categories.append({"categorie": cat, "nb": int(n), "surface_m2": round(surface) if surface is not None else None})
+
+    arrondissements = (
+        df.groupby("arrondissement_affiche")
+        .agg(nb=("categorie", "size"), surface_m2=(backend.SURFACE_COL, "sum"))
+        .round()
+        .reset_index()
+    )
+    total = be.total_surface(**filters)
+    return {
+        "nb": int(len(df)),
+        "surface_totale_m2": round(total) if total is not None else None,
+        "par_categorie": categories,
+        # somme simple (un espace peut déborder sur l'arrondissement voisin)
+        "par_arrondissement": arrondissements.to_dict("records"),
+    }
+
+
+_points = {}
+
+
+def _candidate_points(be, filters):
+    # centroïdes (Lambert-93, en mètres) des espaces de la sélection, gardés
+    # par (version, filtres) : les requêtes suivantes ne font qu'un calcul de distances
+    def load():
+        cols = ["nom", "categorie", "arrondissement_affiche", "centre_lon", "centre_lat", "longitude", "latitude"]
+        df = be.select(cols, **filters)
+        lon = df["centre_lon"].fillna(df["longitude"]) if "centre_lon" in df.columns else df["longitude"]
+        lat = df["centre_lat"].fillna(df["latitude"]) if "centre_lat" in df.columns else df["latitude"]
+        df = df.assign(longitude=lon, latitude=lat)[lon.notna() & lat.notna()]
+        x, y = geostore.to_lambert93(df["longitude"].to_numpy(), df["latitude"].to_numpy())
+        return df[["nom", "categorie", "arrondissement_affiche", "longitude", "latitude"]], x, y
+
+    key = (be.version, json.dumps(filters, sort_keys=True))
+    return dataset.get_or_load(_points, key, load, keep=32)
+
+
+def get_nearest(be, params):
+    lon = _number(params, "lon", float, lo=-180, hi=180)
+    lat = _number(params, "lat", float, lo=-90, hi=90)
+    if lon is None or lat is None:
+        raise ApiError("lon et lat sont obligatoires")
+    k = _number(params, "k", int, 5, 1, MAX_NEAREST)
+
+    df, x, y = _candidate_points(be, parse_filters(params))
+    if df.empty:
+        return {"lon": lon, "lat": lat, "resultats": []}
+    px, py = geostore.to_lambert93(np.array([lon]), np.array([lat]))
+    dist = np.hypot(x - px[0], y - py[0])
+    k = min(k, len(dist))
+    top = np.argpartition(dist, k - 1)[:k]
+    top = top[np.argsort(dist[top], kind="stable")]
+    result = df.iloc[top].assign(distance_m=dist[top].round(1))
+    return {"lon": lon, "lat": lat, "resultats": dataset.json_records(result)}
+
+
+def get_version(be, params):
+    return {
+        "version": be.version,
+        "backend": backend.BACKEND,
+        "nb_espaces": int(be.nb_rows),
+        "categories": be.categories,
+        "arrondissements": be.arrondissements,
+        "annees": [be.year_min, be.year_max],
+    }
+
+
+ROUTES = {
+    "/features": get_features,
+    "/stats": get_stats,
+    "/nearest": get_nearest,
+    "/version": get_version,
+}
+
+
+# =========================
+# Réponses (ETag, gzip, cache)
+# =========================
+class ResponseCache:
+    # LRU des réponses encodées : (version, route, requête) -> (corps, corps gzip)
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = ResponseCache()
+
+
+def etag_for(version, route, query):
+    digest = hashlib.sha256(f"{route}?{query}".encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def _encode(payload):
+    # allow_nan=False : un NaN qui passerait lève une erreur au lieu d'un JSON invalide
+    body = json.dumps(
+        payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False, default=dataset.json_default
+    ).encode()
+    return body, gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+
+
+def handle(target, headers=None, version=None, cache=_cache):
+    # -> (statut, en-têtes, corps) ; sans socket, utilisable tel quel hors serveur HTTP
+    headers = headers or {}
+    url = urlsplit(target)
+    route = url.path.rstrip("/") or "/"
+    if route not in ROUTES:
+        body = _encode({"error": f"route inconnue : {route}", "routes": sorted(ROUTES)})[0]
+        return 404, {"Content-Type": "application/json; charset=utf-8"}, body
+
+    params = parse_qs(url.query)
+    # requête normalisée : ni l'ordre des paramètres ni la forme des listes
+    # (répétées ou séparées par des virgules) ne changent l'ETag ou le cache
+    params.update({name: _values(params, name) for name in LIST_PARAMS if name in params})
+    query = "&".join(f"{k}={v}" for k in sorted(params) for v in params[k])
+    version = version or versions.get_watcher().current
+    etag = etag_for(version, route, query)
+    out = {
+        "Content-Type": "application/json; charset=utf-8",
+        "ETag": etag,
+        # le client garde la réponse mais revalide : le 304 suit la version du dataset
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "X-Dataset-Version": version,
+    }
+    if etag in [t.strip() for t in headers.get("If-None-Match", "").split(",")]:
+        return 304, out, b""
+
+    key = (version, route, query)
+    entry = cache.get(key)
+    if entry is None:
+        be = backend.get_backend(version=version)
+        try:
+            payload = {"version": version, **ROUTES[route](be, params)}
+        except ApiError as e:
+            out.pop("ETag")
+            return e.status, out, _encode({"error": str(e)})[0]
+        entry = _encode(payload)
+        cache.put(key, entry)
+
+    body, gz = entry
+    if gz is not None and "gzip" in headers.get("Accept-Encoding", ""):
+        out["Content-Encoding"] = "gzip"
+        return 200, out, gz
+    return 200, out, body
+
+
+# =========================
+# Serveur
+# =========================
+class ApiHandler(BaseHTTPRequestHandler):
+    # keep-alive ; sans TCP_NODELAY, en-têtes et corps écrits séparément
+    # attendent l'ACK retardé du client (~40 ms par requête)
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "espaces-verts-api"
+
+    def do_GET(self):
+        try:
+            status, headers, body = handle(self.path, self.headers)
+        except Exception as e:
+            status, headers, body = 500, {"Content-Type": "application/json; charset=utf-8"}, _encode({"error": str(e)})[0]
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if os.environ.get("EV_API_LOG") == "1":
+            super().log_message(format, *args)
+
+
+def make_server(host=API_HOST, port=API_PORT):
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+
+def start(host=API_HOST, port=API_PORT):
+    # en tâche de fond (serve.py) : partage le dataset déjà chargé par l'app
+    server = make_server(host, port)
+    threading.Thread(target=server.serve_forever, name="api", daemon=True).start()
+    return server
+
+
+# =========================
+# Benchmark (charge concurrente)
+# =========================
+def bench_targets(be, n):
+    # mélange de requêtes réalistes : peu de combinaisons distinctes, beaucoup de répétitions
+    targets = ["/version", "/stats"]
+    for cat in be.categories:
+        targets.append("/stats?" + urlencode({"categorie": cat}))
+        targets.append("/features?" + urlencode({"categorie": cat, "limit": 50}))
+    for arr in be.arrondissements[:20]:
+        targets.append("/features?" + urlencode({"arrondissement": arr, "ouverture_24h": "oui"}))
+    rng = np.random.default_rng(0)
+    for lon, lat in zip(rng.uniform(2.25, 2.42, 20), rng.uniform(48.82, 48.90, 20)):
+        targets.append("/nearest?" + urlencode({"lon": f"{lon:.4f}", "lat": f"{lat:.4f}", "k": 5}))
+    return [targets[i] for i in rng.integers(0, len(targets), n)]
+
+
+def bench(host, port, targets, concurrency):
+    chunks = [targets[i::concurrency] for i in range(concurrency)]
+
+    def worker(chunk):
+        # une connexion keep-alive par client
+        con = http.client.HTTPConnection(host, port, timeout=30)
+        latencies, sizes, errors = [], 0, 0
+        for target in chunk:
+            start = time.perf_counter()
+            con.request("GET", target, headers={"Accept-Encoding": "gzip"})
+            resp = con.getresponse()
+            sizes += len(resp.read())
+            latencies.append(time.perf_counter() - start)
+            errors += resp.status >= 400
+        con.close()
+        return latencies, sizes, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([lat for r in results for lat in r[0]]) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": sum(r[2] for r in results),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "bytes": sum(r[1] for r in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP des espaces verts")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--bench", action="store_true", help="benchmark sur un serveur local éphémère")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    version = versions.get_watcher().current
+    if not args.bench:
+        print(f"🌐 API sur http://{args.host}:{args.port} (dataset {version}, backend {backend.BACKEND})")
+        make_server(args.host, args.port).serve_forever()
+        return 0
+
+    server = start(args.host, 0)
+    host, port = server.server_address[:2]
+    targets = bench_targets(backend.get_backend(version=version), args.requests)
+    for label in ("1er tour", "2e tour"):
+        r = bench(host, port, targets, args.concurrency)
+        print(
+            f"{label} {r['requests']} requêtes x{args.concurrency} : {r['rps']:.0f} req/s, "
+            f"p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms, "
+            f"{r['bytes'] / 1e6:.1f} Mo, {r['errors']} erreurs"
+        )
+    print(f"cache : {_cache.hits} hits / {_cache.misses} misses")
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
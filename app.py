@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
-import json
-import pydeck as pdk
 import base64
+import os
+
+import backend
+import dataset
+import typo_map
+import versions
 
 def img_to_base64(path):
     with open(path, "rb") as f:
@@ -14,98 +18,103 @@ st.set_page_config(
     layout="wide",
 )
 
-@st.cache_data
-def load_data():
-    # CSV déjà nettoyé (9999 -> NaN)
-    return pd.read_csv("src/espaces_verts_normalized.csv", sep=";")
+# backend de requêtes partagé par process (voir backend.py) : dataset pandas
+# en mémoire par défaut, ou base SQLite avec EV_BACKEND=sqlite.
+# Préchauffé au démarrage par serve.py.
+# La version est lue une fois : tout le rerun reste sur la même, même si le
+# watcher bascule sur un nouveau build entre-temps (voir versions.py).
+version = versions.get_watcher().current
+be = backend.get_backend(version=version)
 
-df = load_data()
+st.title("🌿 Espaces verts à Paris")
 
 # =========================
-# 🏙️ arrondissement depuis le code postal
+# Navigation principale
 # =========================
-df["arrondissement"] = (
-    df["code_postal"]
-    .astype(str)
-    .str.zfill(5)
-    .str[-2:]
-)
+# Contrairement à st.tabs (qui exécute les 4 onglets à chaque rerun),
+# seule la section affichée est calculée. Les widgets ont une clé fixe
+# pour que leur valeur survive quand on change de section.
+SECTIONS = [
+    "🧭 Carte typologique",
+    "📜 Carte historique",
+    "🟩 Couverture verte",
+    "📋 Données",
+    "📈 Statistiques",
+]
+
+PERSISTED_KEYS = [
+    "typo_search",
+    "typo_categories",
+    "typo_arrondissements",
+    "typo_h24",
+    "typo_cloture",
+    "hist_year",
+    "cov_categories",
+    "cov_year",
+    "data_page",
+]
+
+# Streamlit supprime l'état des widgets non affichés pendant un rerun :
+# on le réécrit à chaque passage pour le conserver d'une section à l'autre.
+for key in PERSISTED_KEYS:
+    if key in st.session_state:
+        st.session_state[key] = st.session_state[key]
 
-CP_OUTSIDE = {
-    "92220": "Bagneux (92)",
-    "93210": "Saint-Denis (93)",
-    "93400": "Saint-Ouen (93)",
-    "93500": "Pantin (93)",
-    "94200": "Ivry-sur-Seine (94)",
-    "94300": "Vincennes (94)",
-    "94320": "Thiais (94)",
-}
-
-def format_arrondissement_row(row):
-    cp = str(row.get("code_postal", "")).strip()
-    arr = str(row.get("arrondissement", "")).strip()
+# ---------------------------------------------------------------------
+# 1. CARTE TYPOLOGIQUE (avec filtres + KPI)
+# ---------------------------------------------------------------------
+# caches clés par version du dataset : un nouveau build ne sert jamais
+# de résultats périmés, et l'ancienne version reste servie aux reruns en cours
+@st.cache_data(max_entries=128, show_spinner=False)
+def typo_kpis(version, filters):
+    be = backend.get_backend(version=version)
+    return be.count(**filters), be.total_surface(**filters)
 
-    if cp in CP_OUTSIDE:
-        return CP_OUTSIDE[cp]
 
-    if cp.startswith("75") and len(arr) == 2 and arr.isdigit():
-        n = int(arr)
-        return "1er" if n == 1 else f"{n}e"
+@st.cache_data(max_entries=64, show_spinner=False)
+def typo_geojson(version, filters):
+    # carte sans filtre : déjà construite par serve.py (cf. typo_map.py)
+    return typo_map.get_geojson(backend.get_backend(version=version), filters)
 
-    # fallback commune
-    if "commune" in row and str(row["commune"]).strip().lower() not in ["", "nan", "none"]:
-        return str(row["commune"]).strip()
 
-    return cp
+def search_index(version):
+    # index de trigrammes construit par load_data.py (None s'il n'existe pas)
+    import search
 
-df["arrondissement_affiche"] = df.apply(format_arrondissement_row, axis=1)
+    return search.get_index(os.path.join(dataset.artifacts_dir(version), search.SEARCH_SUBDIR))
 
-st.title("🌿 Espaces verts à Paris")
 
-# =========================
-# ONGlets principaux
-# =========================
-tab_carte_typo, tab_carte_hist, tab_data, tab_stats = st.tabs(
-    ["🧭 Carte typologique", "📜 Carte historique", "📋 Données", "📈 Statistiques"]
-)
+def render_carte_typo(be):
+    import pydeck as pdk
 
-# ---------------------------------------------------------------------
-# 1. CARTE TYPOLOGIQUE (avec filtres + KPI)
-# ---------------------------------------------------------------------
-with tab_carte_typo:
     st.subheader("🧭 Carte typologique")
 
+    # ===== RECHERCHE =====
+    hit = None
+    index = search_index(be.version)
+    if index is not None:
+        query = st.text_input(
+            "Rechercher un espace vert",
+            key="typo_search",
+            placeholder="Nom, ancien nom ou adresse (ex. : jardin des plantes, cimetiere...)",
+        )
+        if query.strip():
+            results = index.search(query)
+            if results.empty:
+                st.info("Aucun espace vert ne ressemble à cette recherche.")
+            else:
+                labels = [
+                    f"{r.nom} ({r.arrondissement_affiche})" if pd.notna(r.arrondissement_affiche) else r.nom
+                    for r in results.itertuples()
+                ]
+                choice = st.selectbox("Résultats", options=range(len(results)), format_func=labels.__getitem__)
+                hit = results.iloc[choice]
+
     # ===== FILTRES =====
     st.markdown("### Filtres")
 
-    cats = sorted(df["categorie"].dropna().unique())
-   
-    # 1. on récupère tous les arrondissements affichés uniques
-    arr_unique = df[["arrondissement_affiche", "code_postal"]].drop_duplicates()
-
-    # 2. on sépare Paris (75xxx) du reste
-    paris = arr_unique[arr_unique["code_postal"].astype(str).str.startswith("75")]
-    hors_paris = arr_unique[~arr_unique["code_postal"].astype(str).str.startswith("75")]
-
-    # 3. ordre pour Paris : 1er, 2e, 3e, ..., 20e
-    paris_order = []
-    for i in range(1, 21):
-        if i == 1:
-            paris_order.append("1er")
-        else:
-            paris_order.append(f"{i}e")
-
-    # on garde seulement ceux qui existent vraiment dans le df
-    paris_sorted = [a for a in paris_order if a in set(paris["arrondissement_affiche"])]
-
-    # 4. pour le hors Paris : on trie par code postal (donc 92..., puis 93..., puis 94...)
-    hors_paris_sorted = (
-        hors_paris.sort_values("code_postal")["arrondissement_affiche"].tolist()
-    )
-
-    # 5. on concatène
-    arrs = paris_sorted + hors_paris_sorted
-
+    cats = be.categories
+    arrs = be.arrondissements
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -113,7 +122,7 @@ with tab_carte_typo:
         categories_sel = st.multiselect(
             "Catégories",
             options=cats,
-            default=[],
+            key="typo_categories",
             placeholder="Choisir une ou plusieurs catégories",
         )
 
@@ -121,7 +130,7 @@ with tab_carte_typo:
         arrondissements_sel = st.multiselect(
             "Arrondissement",
             options=arrs,
-            default=[],
+            key="typo_arrondissements",
             placeholder="1er, 2e, ...",
         )
 
@@ -129,101 +138,45 @@ with tab_carte_typo:
         h24_sel = st.selectbox(
             "Ouverture 24h/24",
             options=["Tous", "Oui", "Non"],
-            index=0,
+            key="typo_h24",
         )
 
     with col4:
         cloture_sel = st.selectbox(
             "Clôturé",
             options=["Tous", "Oui", "Non"],
-            index=0,
+            key="typo_cloture",
         )
 
     # ===== Application des filtres =====
-    filtered_df = df.copy()
-
-    if categories_sel:
-        filtered_df = filtered_df[filtered_df["categorie"].isin(categories_sel)]
-    # si aucune catégorie sélectionnée → on garde tout
-    else:
-        filtered_df = filtered_df.copy()
-
-
-    if arrondissements_sel:
-        filtered_df = filtered_df[filtered_df["arrondissement_affiche"].isin(arrondissements_sel)]
-
-    if h24_sel != "Tous" and "ouverture_24h" in filtered_df.columns:
-        want_open = (h24_sel == "Oui")
-        filtered_df = filtered_df[filtered_df["ouverture_24h"] == want_open]
-
-    if cloture_sel != "Tous" and "presence_cloture" in filtered_df.columns:
-        want_cloture = (cloture_sel == "Oui")
-        filtered_df = filtered_df[filtered_df["presence_cloture"] == want_cloture]
+    # si aucune catégorie / aucun arrondissement sélectionné → on garde tout
+    filters = {
+        "categories": categories_sel,
+        "arrondissements": arrondissements_sel,
+        "ouverture_24h": None if h24_sel == "Tous" else (h24_sel == "Oui"),
+        "presence_cloture": None if cloture_sel == "Tous" else (cloture_sel == "Oui"),
+    }
 
     # ===== KPI =====
+    nb_espaces, total_surface = typo_kpis(be.version, filters)
     k1, k2, k3 = st.columns(3)
-    k1.metric("Espaces affichés", len(filtered_df))
+    k1.metric("Espaces affichés", nb_espaces)
     k2.metric("Catégories sélectionnées", len(categories_sel) if categories_sel else len(cats))
 
-    if "surface_totale_reelle_m2" in filtered_df.columns:
-        total_surface = filtered_df["surface_totale_reelle_m2"].sum(min_count=1)
-        # s'il y a encore des NaN -> ignore
-        if pd.isna(total_surface):
-            total_surface_fmt = "—"
-        else:
-            total_surface = int(total_surface)
-            total_surface_fmt = f"{total_surface:,}".replace(",", " ")
-        k3.metric("Surface totale (m²)", total_surface_fmt)
+    # s'il y a encore des NaN -> ignore
+    if total_surface is None:
+        total_surface_fmt = "—"
     else:
-        k3.metric("Surface totale (m²)", "—")
+        total_surface = int(total_surface)
+        total_surface_fmt = f"{total_surface:,}".replace(",", " ")
+    k3.metric("Surface totale (m²)", total_surface_fmt)
 
     # ===== Carte typologique =====
-    geo_df = filtered_df[filtered_df["geo_shape"].notna()].copy()
+    geojson_obj = typo_geojson(be.version, filters)
 
-    def parse_geojson(x):
-        try:
-            return json.loads(x)
-        except Exception:
-            return None
-
-    geo_df["geometry"] = geo_df["geo_shape"].apply(parse_geojson)
-    geo_df = geo_df[geo_df["geometry"].notna()]
-
-    if geo_df.empty:
+    if not geojson_obj["features"]:
         st.warning("Aucun espace vert ne correspond à vos critères de recherches.")
     else:
-        color_map = {
-            "Bois": [0, 100, 0, 120],
-            "Parc": [46, 204, 113, 120],
-            "Square": [52, 152, 219, 120],
-            "Jardin": [241, 196, 15, 120],
-            "Jardin partage": [230, 126, 34, 120],
-            "Pelouse": [39, 174, 96, 120],
-            "Mail": [142, 68, 173, 120],
-            "Promenade": [26, 188, 156, 120],
-            "Terrain de boules": [192, 57, 43, 120],
-            "Forêt urbaine": [0, 128, 0, 120],
-            "Ile": [52, 73, 94, 120],
-            "Cimetière": [149, 165, 166, 120],
-        }
-
-        features = []
-        for _, row in geo_df.iterrows():
-            fill = color_map.get(row["categorie"], [127, 140, 141, 120])
-            features.append({
-                "type": "Feature",
-                "properties": {
-                    "nom": row["nom"],
-                    "categorie": row["categorie"],
-                    "ouverture_24h": "Oui" if row.get("ouverture_24h") else "Non",
-                    "presence_cloture": "Oui" if row.get("presence_cloture") else "Non",
-                    "fill_color": fill,
-                },
-                "geometry": row["geometry"],
-            })
-
-        geojson_obj = {"type": "FeatureCollection", "features": features}
-
         geojson_layer = pdk.Layer(
             "GeoJsonLayer",
             data=geojson_obj,
@@ -239,9 +192,28 @@ with tab_carte_typo:
             zoom=11,
             pitch=0,
         )
+        layers = [geojson_layer]
+
+        # résultat de recherche : on zoome dessus et on le marque
+        if hit is not None and pd.notna(hit["latitude"]) and pd.notna(hit["longitude"]):
+            view_state = pdk.ViewState(
+                latitude=float(hit["latitude"]),
+                longitude=float(hit["longitude"]),
+                zoom=16,
+                pitch=0,
+            )
+            layers.append(pdk.Layer(
+                "ScatterplotLayer",
+                data=[{"nom": hit["nom"], "position": [float(hit["longitude"]), float(hit["latitude"])]}],
+                get_position="position",
+                get_radius=25,
+                radius_min_pixels=6,
+                get_fill_color=[231, 76, 60, 200],
+                pickable=True,
+            ))
 
         r = pdk.Deck(
-            layers=[geojson_layer],
+            layers=layers,
             initial_view_state=view_state,
             tooltip={
                 "text": "{nom}\n{categorie}\nOuvert 24h/24 : {ouverture_24h}\nClôturé : {presence_cloture}"
@@ -254,301 +226,368 @@ with tab_carte_typo:
 # 2. CARTE HISTORIQUE
 # ---------------------------------------------------------------------
 
-with tab_carte_hist:
+# year = dernière année d'événement (history.as_of) : tous les crans du curseur
+# entre deux événements partagent la même entrée de cache
+@st.cache_data(max_entries=128, show_spinner=False)
+def hist_selection(version, year):
+    import history
+
+    be = backend.get_backend(version=version)
+    hist_df = be.select(
+        ["nom", "annee_ouverture", "latitude", "longitude", "geometry"],
+        year_max=year,
+        has_geometry=True,
+    )
+    # nom porté à cette date + rénovation, lus dans l'index d'intervalles
+    state = history.get_history(be).state(year)
+    return hist_df.join(state[["nom_epoque", "renomme_depuis", "renove", "annee_renovation"]])
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def hist_geojson(version, year):
+    hist_geo = hist_selection(version, year)
+    features = []
+    for row in hist_geo.itertuples():
+        year_val = pd.to_numeric(row.annee_ouverture, errors="coerce")
+        year_val = int(year_val) if pd.notna(year_val) else ""
+        histoire = []
+        if row.renomme_depuis:
+            histoire.append(f"Aujourd'hui : {row.nom}")
+        if row.renove:
+            histoire.append(f"Rénové en {int(row.annee_renovation)}")
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "nom": row.nom_epoque if isinstance(row.nom_epoque, str) else row.nom,
+                "annee_ouverture": year_val,
+                "histoire": "\n".join(histoire),
+                # rénové -> vert plus soutenu
+                "fill_color": [30, 132, 73, 170] if row.renove else [46, 204, 113, 140],
+            },
+            "geometry": row.geometry,
+        })
+
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+    }
+
+
+def render_carte_hist(be):
+    import pydeck as pdk
+
     st.subheader("📜 Carte historique")
 
-    if "annee_ouverture" not in df.columns:
-        st.warning("Pas de colonne 'annee_ouverture' dans les données.")
+    if be.year_min is None:
+        st.warning("Aucune année d'ouverture renseignée.")
     else:
-        years_series = pd.to_numeric(df["annee_ouverture"], errors="coerce").dropna()
-        if years_series.empty:
-            st.warning("Aucune année d'ouverture renseignée.")
-        else:
-            min_year = int(years_series.min())
-            max_year = int(years_series.max())
-
-            st.markdown("""
-                <style>
-                /* Centrage + largeur contrôlée */
-                div[data-baseweb="slider"] {
-                    width: 90% !important;
-                    margin: 0 auto;
-                }
-
-                /* Barre de fond (inactive) */
-                .stSlider [role="presentation"] > div:first-child {
-                    height: 0.4rem !important;
-                    background-color: rgba(255, 255, 255, 0.15);
-                }
-
-                /* Barre active (valeur sélectionnée) */
-                .stSlider [role="presentation"] > div:nth-child(2) {
-                    height: 0.4rem !important;
-                    background-color: #2ecc71 !important;
-                }
-
-                /* Bouton circulaire */
-                .stSlider [role="slider"] {
-                    width: 1.2rem !important;
-                    height: 1.2rem !important;
-                    background-color: #2ecc71 !important;
-                    border: 2px solid white !important;
-                }
-                </style>
-            """, unsafe_allow_html=True)
-
-            # après selected_year = st.slider(...)
-            selected_year = st.slider(
-                "Sélectionner une année",
-                min_value=min_year,
-                max_value=max_year,
-                value=max_year,
-                step=1,
-                label_visibility="collapsed",
-            )
+        min_year = int(be.year_min)
+        max_year = int(be.year_max)
+
+        st.markdown("""
+            <style>
+            /* Centrage + largeur contrôlée */
+            div[data-baseweb="slider"] {
+                width: 90% !important;
+                margin: 0 auto;
+            }
 
-            # fonction de mapping année -> image
-            def get_image_for_year(year: int) -> str:
-
-                # 1. 1688–1715 : Louis XIV
-                if year <= 1715:
-                    return "src/assets/louis-xiv.png"
-
-                # 2. 1716–1788 : Lumières
-                elif year <= 1788:
-                    return "src/assets/place-louis-xv.jpg"
-
-                # 3. 1789–1799 : Révolution
-                elif year <= 1799:
-                    return "src/assets/rev.jpg"
-
-                # 4. 1800–1815 : Premier Empire
-                elif year <= 1815:
-                    return "src/assets/napoleon.jpeg"
-
-                # 5. 1816–1852 : Restauration / Monarchie de Juillet
-                elif year <= 1852:
-                    return "src/assets/monarchie-de-juillet.jpg"
-
-                # 6. 1853–1870 : Haussmann
-                elif year <= 1870:
-                    return "src/assets/grands-boulevards.jpg"
-
-                # 7. 1871 : Commune
-                elif year == 1871:
-                    return "src/assets/commune-paris.jpg"
-
-                # 8. 1872–1900 : Belle Époque
-                elif year <= 1900:
-                    return "src/assets/eiffel.jpg"
-
-                # 9. 1901–1918 : modernité + WW1
-                elif year <= 1918:
-                    return "src/assets/paris-1916.jpg"
-
-                # 10. 1919–1939 : entre-deux-guerres
-                elif year <= 1939:
-                    return "src/assets/paris-1930.jpeg"
-
-                # 11. 1940–1944 : occupation
-                elif year <= 1944:
-                    return "src/assets/paris-1940.jpeg"
-                
-                # 12. 1945 : libération
-                elif year <= 1945:
-                    return "src/assets/paris-liberation.jpeg"
-
-                # 13. 1946–1970 : reconstruction & modernisation
-                elif year <= 1970:
-                    return "src/assets/trente-glorieuses.jpg"
-
-                # 14. 1971–2000 : Paris contemporain
-                elif year <= 2000:
-                    return "src/assets/paris-1980.jpg"
-
-                # 15. 2001-2010 : Paris contemporain
-                elif year <= 2010:
-                    return "src/assets/paris-2000.jpeg"
-                
-                # 16. 2011–2025 : Paris durable
-                else:
-                    return "src/assets/paris-2025.jpg"
+            /* Barre de fond (inactive) */
+            .stSlider [role="presentation"] > div:first-child {
+                height: 0.4rem !important;
+                background-color: rgba(255, 255, 255, 0.15);
+            }
 
-            image_path = get_image_for_year(selected_year)
+            /* Barre active (valeur sélectionnée) */
+            .stSlider [role="presentation"] > div:nth-child(2) {
+                height: 0.4rem !important;
+                background-color: #2ecc71 !important;
+            }
 
+            /* Bouton circulaire */
+            .stSlider [role="slider"] {
+                width: 1.2rem !important;
+                height: 1.2rem !important;
+                background-color: #2ecc71 !important;
+                border: 2px solid white !important;
+            }
+            </style>
+        """, unsafe_allow_html=True)
+
+        # valeur par défaut posée une seule fois (puis conservée entre sections)
+        if "hist_year" not in st.session_state:
+            st.session_state["hist_year"] = max_year
+        st.session_state["hist_year"] = min(max(st.session_state["hist_year"], min_year), max_year)
+
+        # après selected_year = st.slider(...)
+        selected_year = st.slider(
+            "Sélectionner une année",
+            min_value=min_year,
+            max_value=max_year,
+            step=1,
+            key="hist_year",
+            label_visibility="collapsed",
+        )
 
-            # filtrage une seule fois
-            year_col = pd.to_numeric(df["annee_ouverture"], errors="coerce")
-            mask_year = year_col.notna() & (year_col <= selected_year)
-            hist_df = df[mask_year].copy()
-            hist_geo = hist_df[hist_df["geo_shape"].notna()].copy()
-            hist_geo["geometry"] = hist_geo["geo_shape"].apply(
-                lambda x: json.loads(x) if pd.notna(x) else None
-            )
-            hist_geo = hist_geo[hist_geo["geometry"].notna()]
-            nb_ev = len(hist_geo)
+        # image de l'époque (table triée + bisect, WebP redimensionné gardé en mémoire)
+        import eras
 
-            # 🟩 mise en page 2 colonnes pour tout le reste
-            left_col, right_col = st.columns([1, 2])
+        era_image = eras.era_image(selected_year)
 
-            with left_col:
-                # titre centré
+
+        # filtrage une seule fois (poussé dans le backend), par intervalle d'état
+        import history
+
+        as_of = history.get_history(be).as_of(selected_year)
+        state_year = selected_year if as_of is None else as_of
+        hist_geo = hist_selection(be.version, state_year)
+        nb_ev = len(hist_geo)
+
+        # 🟩 mise en page 2 colonnes pour tout le reste
+        left_col, right_col = st.columns([1, 2])
+
+        with left_col:
+            # titre centré
+            st.markdown(
+                f"""
+                <h3 style="text-align:center; margin-top:0;">
+                    En
+                    <span style="font-size:2.6rem; font-weight:1000; color:#2ecc71;">
+                        {selected_year}
+                    </span>
+                </h3>
+                """,
+                unsafe_allow_html=True,
+            )
+
+            # 3 sous-colonnes pour centrer l'image
+            c1, c2, c3 = st.columns([1, 6, 1])
+            with c2:
+                st.image(era_image, width=800)
+
+            # 3 sous-colonnes pour centrer le texte
+            t1, t2, t3 = st.columns([1, 2, 1])
+            with t2:
+                pluriel = nb_ev > 1
+                texte = (
+                    f"Il y avait déjà <span style='color:#2ecc71; font-size:1.8rem; font-weight:800;'>{nb_ev}</span> espaces verts qui existent encore aujourd'hui."
+                    if pluriel
+                    else f"Il y avait déjà <span style='color:#2ecc71; font-size:1.8rem; font-weight:800;'>{nb_ev}</span> espace vert qui existe encore aujourd'hui."
+                )
                 st.markdown(
                     f"""
-                    <h3 style="text-align:center; margin-top:0;">
-                        En
-                        <span style="font-size:2.6rem; font-weight:1000; color:#2ecc71;">
-                            {selected_year}
-                        </span>
-                    </h3>
+                    <p style="
+                        text-align:center;
+                        font-weight:600;
+                        font-size:1.1rem;
+                        margin-top:1.2rem;
+                    ">
+                        {texte}
+                    </p>
                     """,
                     unsafe_allow_html=True,
                 )
 
-                # 3 sous-colonnes pour centrer l'image
-                c1, c2, c3 = st.columns([1, 6, 1])
-                with c2:
-                    st.image(image_path, width=800)
-
-                # 3 sous-colonnes pour centrer le texte
-                t1, t2, t3 = st.columns([1, 2, 1])
-                with t2:
-                    pluriel = nb_ev > 1
-                    texte = (
-                        f"Il y avait déjà <span style='color:#2ecc71; font-size:1.8rem; font-weight:800;'>{nb_ev}</span> espaces verts qui existent encore aujourd'hui."
-                        if pluriel
-                        else f"Il y avait déjà <span style='color:#2ecc71; font-size:1.8rem; font-weight:800;'>{nb_ev}</span> espace vert qui existe encore aujourd'hui."
-                    )
-                    st.markdown(
-                        f"""
-                        <p style="
-                            text-align:center;
-                            font-weight:600;
-                            font-size:1.1rem;
-                            margin-top:1.2rem;
-                        ">
-                            {texte}
-                        </p>
-                        """,
-                        unsafe_allow_html=True,
+        with right_col:
+            if hist_geo.empty:
+                st.warning("Aucun espace à afficher pour cette année.")
+            else:
+                geojson_obj = hist_geojson(be.version, state_year)
+
+                nb_renommes = int(hist_geo["renomme_depuis"].sum())
+                nb_renoves = int(hist_geo["renove"].sum())
+                if nb_renommes or nb_renoves:
+                    st.caption(
+                        f"En {selected_year} : {nb_renommes} espace(s) portaient encore leur ancien nom, "
+                        f"{nb_renoves} avaient déjà été rénovés (en vert foncé)."
                     )
 
-            with right_col:
-                if hist_geo.empty:
-                    st.warning("Aucun espace à afficher pour cette année.")
-                else:
-                    features = []
-
-                    for _, row in hist_geo.iterrows():
-                        year_val = pd.to_numeric(row.get("annee_ouverture", None), errors="coerce")
-                        year_val = int(year_val) if pd.notna(year_val) else ""
-                        features.append({
-                            "type": "Feature",
-                            "properties": {
-                                "nom": row["nom"],
-                                "annee_ouverture": year_val,
-                                "fill_color": [46, 204, 113, 140],
-                            },
-                            "geometry": row["geometry"],
-                        })
-
-                    geojson_obj = {
-                        "type": "FeatureCollection",
-                        "features": features,
-                    }
-
-                    if {"latitude", "longitude"}.issubset(hist_geo.columns):
-                        geo_pts = hist_geo[hist_geo["latitude"].notna() & hist_geo["longitude"].notna()]
-
-                        if len(geo_pts) == 1:
-                            # un seul lieu -> on zoom fort dessus
-                            lat_center = float(geo_pts.iloc[0]["latitude"])
-                            lon_center = float(geo_pts.iloc[0]["longitude"])
+                if {"latitude", "longitude"}.issubset(hist_geo.columns):
+                    geo_pts = hist_geo[hist_geo["latitude"].notna() & hist_geo["longitude"].notna()]
+
+                    if len(geo_pts) == 1:
+                        # un seul lieu -> on zoom fort dessus
+                        lat_center = float(geo_pts.iloc[0]["latitude"])
+                        lon_center = float(geo_pts.iloc[0]["longitude"])
+                        zoom_level = 14
+                    elif len(geo_pts) > 1:
+                        lat_min = geo_pts["latitude"].min()
+                        lat_max = geo_pts["latitude"].max()
+                        lon_min = geo_pts["longitude"].min()
+                        lon_max = geo_pts["longitude"].max()
+
+                        lat_center = (lat_min + lat_max) / 2
+                        lon_center = (lon_min + lon_max) / 2
+
+                        # on regarde à quel point c’est étalé pour adapter le zoom
+                        span = max(lat_max - lat_min, lon_max - lon_min)
+                        if span < 0.005:
                             zoom_level = 14
-                        elif len(geo_pts) > 1:
-                            lat_min = geo_pts["latitude"].min()
-                            lat_max = geo_pts["latitude"].max()
-                            lon_min = geo_pts["longitude"].min()
-                            lon_max = geo_pts["longitude"].max()
-
-                            lat_center = (lat_min + lat_max) / 2
-                            lon_center = (lon_min + lon_max) / 2
-
-                            # on regarde à quel point c’est étalé pour adapter le zoom
-                            span = max(lat_max - lat_min, lon_max - lon_min)
-                            if span < 0.005:
-                                zoom_level = 14
-                            elif span < 0.01:
-                                zoom_level = 13
-                            elif span < 0.05:
-                                zoom_level = 12
-                            else:
-                                zoom_level = 11
+                        elif span < 0.01:
+                            zoom_level = 13
+                        elif span < 0.05:
+                            zoom_level = 12
                         else:
-                            # pas de coordonnées exploitables → vue Paris
-                            lat_center = 48.8566
-                            lon_center = 2.3522
-                            zoom_level = 15
+                            zoom_level = 11
                     else:
-                        # fallback si pas de colonnes latitude/longitude
+                        # pas de coordonnées exploitables → vue Paris
                         lat_center = 48.8566
                         lon_center = 2.3522
-                        zoom_level = 11
-
-                    # si on est avant 1791 → zoom dynamique
-                    if selected_year < 1791 and {"latitude", "longitude"}.issubset(hist_geo.columns):
-                        pts = hist_geo[hist_geo["latitude"].notna() & hist_geo["longitude"].notna()]
-                        if len(pts) >= 1:
-                            lat_center = float(pts.iloc[0]["latitude"])
-                            lon_center = float(pts.iloc[0]["longitude"])
-                            zoom_level = 14
-                        else:
-                            # fallback paris
-                            lat_center = 48.8566
-                            lon_center = 2.3522
-                            zoom_level = 11
+                        zoom_level = 15
+                else:
+                    # fallback si pas de colonnes latitude/longitude
+                    lat_center = 48.8566
+                    lon_center = 2.3522
+                    zoom_level = 11
+
+                # si on est avant 1791 → zoom dynamique
+                if selected_year < 1791 and {"latitude", "longitude"}.issubset(hist_geo.columns):
+                    pts = hist_geo[hist_geo["latitude"].notna() & hist_geo["longitude"].notna()]
+                    if len(pts) >= 1:
+                        lat_center = float(pts.iloc[0]["latitude"])
+                        lon_center = float(pts.iloc[0]["longitude"])
+                        zoom_level = 14
                     else:
-                        # à partir de 1791 on garde le zoom paris
+                        # fallback paris
                         lat_center = 48.8566
                         lon_center = 2.3522
                         zoom_level = 11
+                else:
+                    # à partir de 1791 on garde le zoom paris
+                    lat_center = 48.8566
+                    lon_center = 2.3522
+                    zoom_level = 11
+
+                view_state = pdk.ViewState(
+                    latitude=lat_center,
+                    longitude=lon_center,
+                    zoom=zoom_level,
+                    pitch=0,
+                )
 
-                    view_state = pdk.ViewState(
-                        latitude=lat_center,
-                        longitude=lon_center,
-                        zoom=zoom_level,
-                        pitch=0,
-                    )
+                geojson_layer = pdk.Layer(
+                    "GeoJsonLayer",
+                    data=geojson_obj,
+                    get_fill_color="properties.fill_color",
+                    get_line_color=[0, 0, 0],
+                    line_width_min_pixels=1,
+                    pickable=True,
+                )
 
-                    geojson_layer = pdk.Layer(
-                        "GeoJsonLayer",
-                        data=geojson_obj,
-                        get_fill_color="properties.fill_color",
-                        get_line_color=[0, 0, 0],
-                        line_width_min_pixels=1,
-                        pickable=True,
-                    )
+                r = pdk.Deck(
+                    layers=[geojson_layer],
+                    initial_view_state=view_state,
+                    tooltip={"text": "{nom}\nOuvert en {annee_ouverture}\n{histoire}"},
+                )
 
-                    r = pdk.Deck(
-                        layers=[geojson_layer],
-                        initial_view_state=view_state,
-                        tooltip={"text": "{nom}\nOuvert en {annee_ouverture}"},
-                    )
+                st.pydeck_chart(r)
 
-                    st.pydeck_chart(r)
+
+# ---------------------------------------------------------------------
+# 3. COUVERTURE VERTE (raster, voir green_cover.py)
+# ---------------------------------------------------------------------
+
+# le raster est lu sur disque (calculé une seule fois par version + filtres),
+# puis gardé en mémoire pour les reruns suivants
+@st.cache_data(max_entries=32, show_spinner="Calcul de la couverture verte...")
+def coverage_layer(version, categories, year_max):
+    import green_cover
+
+    result, png = green_cover.get_coverage(
+        backend.get_backend(version=version), list(categories), year_max
+    )
+    if result is None:
+        return None
+    return {
+        "bounds": result["bounds"],
+        "image": "data:image/png;base64," + base64.b64encode(png).decode(),
+        "green_m2": result["green_m2"],
+        "pixels": result["pixels"],
+        "arrondissements": pd.DataFrame(result["arrondissements"]),
+    }
+
+
+def render_couverture(be):
+    import pydeck as pdk
+
+    st.subheader("🟩 Couverture verte")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        categories_sel = st.multiselect(
+            "Catégories",
+            options=be.categories,
+            key="cov_categories",
+            placeholder="Toutes les catégories",
+        )
+
+    year_max = None
+    with col2:
+        if be.year_min is not None:
+            min_year, max_year = int(be.year_min), int(be.year_max)
+            if "cov_year" not in st.session_state:
+                st.session_state["cov_year"] = max_year
+            st.session_state["cov_year"] = min(max(st.session_state["cov_year"], min_year), max_year)
+            selected_year = st.slider(
+                "Ouverts au plus tard en",
+                min_value=min_year,
+                max_value=max_year,
+                step=1,
+                key="cov_year",
+            )
+            # curseur au maximum -> on garde aussi les espaces sans année
+            year_max = None if selected_year == max_year else selected_year
+
+    layer = coverage_layer(be.version, tuple(sorted(categories_sel)), year_max)
+    if layer is None:
+        st.warning("Aucun espace vert ne correspond à vos critères de recherches.")
+        return
+
+    k1, k2 = st.columns(2)
+    k1.metric("Surface verte (m², sans double compte)", f"{int(layer['green_m2']):,}".replace(",", " "))
+    k2.metric("Cellules calculées", f"{layer['pixels']:,}".replace(",", " "))
+
+    lon_min, lat_min, lon_max, lat_max = layer["bounds"]
+    bitmap = pdk.Layer(
+        "BitmapLayer",
+        data=None,
+        image=layer["image"],
+        bounds=[[lon_min, lat_min], [lon_min, lat_max], [lon_max, lat_max], [lon_max, lat_min]],
+        opacity=0.9,
+    )
+    st.pydeck_chart(pdk.Deck(
+        layers=[bitmap],
+        initial_view_state=pdk.ViewState(latitude=48.8566, longitude=2.3522, zoom=11, pitch=0),
+    ))
+    st.caption("Part de la maille (200 m) couverte par des espaces verts : plus c'est foncé, plus c'est vert.")
+
+    st.markdown("### Par arrondissement")
+    table = layer["arrondissements"].rename(columns={
+        "arrondissement_affiche": "Arrondissement",
+        "surface_verte_m2": "Surface verte (m²)",
+        "couverture_pct": "Couverture (%)",
+    })
+    order = {a: i for i, a in enumerate(be.arrondissements)}
+    table = table.sort_values("Arrondissement", key=lambda s: s.map(order))
+    st.dataframe(table, hide_index=True, use_container_width=True)
 
 
 # ---------------------------------------------------------------------
-# 3. ONGLET DONNÉES
+# 4. ONGLET DONNÉES
 # ---------------------------------------------------------------------
-with tab_data:
-    st.subheader("📋 Données")
+DATA_PAGE_SIZE = 5000
 
-    view_df = df.copy()
+# colonnes d'affichage calculées sur la page affichée (ou sur l'export)
+def prepare_view(view_df):
+    # colonnes d'affichage en opérations vectorisées (coût négligeable même
+    # sur tout le dataset pour l'export) ; arrondissement_affiche vient du backend
+    view_df = view_df.copy()
 
-    # surface fusionnée
+    # surface retenue par load_data.py, sinon fusion des surfaces déclarées
     surface = None
-    if "surface_totale_reelle_m2" in view_df.columns:
+    if backend.SURFACE_COL in view_df.columns:
+        surface = view_df[backend.SURFACE_COL]
+    elif "surface_totale_reelle_m2" in view_df.columns:
         surface = view_df["surface_totale_reelle_m2"]
         if "surface_calculee_m2" in view_df.columns:
             surface = surface.fillna(view_df["surface_calculee_m2"])
@@ -561,67 +600,61 @@ with tab_data:
             surface = view_df["surface_calculee"]
 
     view_df["surface"] = surface if surface is not None else None
+    view_df["surface_affichee"] = dataset.format_thousands(view_df["surface"])
 
-    def format_surface(x):
-        if pd.isna(x):
-            return ""
-        try:
-            x = int(float(x))
-            return f"{x:,}".replace(",", " ")
-        except Exception:
-            return str(x)
-
-    view_df["surface_affichee"] = view_df["surface"].apply(format_surface)
-
-    # adresse
-    addr_cols = [c for c in view_df.columns if "adresse" in c.lower()]
-    if addr_cols:
-        def join_addr(row):
-            parts = []
-            for v in row.tolist():
-                if pd.isna(v):
-                    continue
-                s = str(v).strip()
-                if s == "" or s.lower() == "nan":
-                    continue
-                parts.append(s)
-            joined = " ".join(parts)
-            return " ".join(joined.split())
-        view_df["adresse"] = view_df[addr_cols].apply(join_addr, axis=1)
-    else:
-        view_df["adresse"] = view_df.get("code_postal", "").astype(str)
-
-    # arrondissement affiché
-    CP_OUTSIDE = {
-        "92220": "Bagneux",
-        "93210": "Saint-Denis",
-        "93400": "Saint-Ouen",
-        "93500": "Pantin",
-        "94200": "Ivry-sur-Seine",
-        "94300": "Vincennes",
-        "94320": "Thiais",
-    }
+    # adresse jointe par load_data.py (recalculée pour un CSV plus ancien)
+    if "adresse" not in view_df.columns:
+        view_df["adresse"] = dataset.address_text(view_df)
 
-    def format_arrondissement(row):
-        cp = str(row.get("code_postal", "")).strip()
-        arr = str(row.get("arrondissement", "")).strip()
+    return view_df
 
-        if cp in CP_OUTSIDE:
-            return CP_OUTSIDE[cp]
 
-        if cp.startswith("75") and len(arr) == 2 and arr.isdigit():
-            n = int(arr)
-            if n == 1:
-                return "1er"
-            else:
-                return f"{n}e"
+def export_columns(view_df):
+    export_cols = [
+        "nom",
+        "categorie",
+        "adresse",
+        "arrondissement",
+        "code_postal",
+        "surface",
+    ]
+    if "annee_ouverture" in view_df.columns:
+        export_cols.append("annee_ouverture")
+    if "presence_cloture" in view_df.columns:
+        export_cols.append("presence_cloture")
+    if "ouverture_24h" in view_df.columns:
+        export_cols.append("ouverture_24h")
+    # surface du polygone + écart avec la surface déclarée (load_data.py)
+    for col in ("surface_geo_m2", "surface_ecart"):
+        if col in view_df.columns:
+            export_cols.append(col)
+    return export_cols
 
-        if "commune" in row and str(row["commune"]).strip().lower() not in ["", "nan", "none"]:
-            return str(row["commune"]).strip()
 
-        return cp
+# export complet généré seulement au clic, une fois par version
+@st.cache_data(max_entries=2, show_spinner=False)
+def export_csv(version):
+    full_df = prepare_view(backend.get_backend(version=version).select())
+    return full_df[export_columns(full_df)].to_csv(index=False, sep=";")
 
-    view_df["arrondissement_affiche"] = view_df.apply(format_arrondissement, axis=1)
+
+def render_donnees(be):
+    st.subheader("📋 Données")
+
+    # pagination poussée dans le backend
+    total_rows = be.count()
+    nb_pages = max(1, -(-total_rows // DATA_PAGE_SIZE))
+    page = 1
+    if nb_pages > 1:
+        page = st.number_input(
+            f"Page (sur {nb_pages})",
+            min_value=1,
+            max_value=nb_pages,
+            step=1,
+            key="data_page",
+        )
+
+    view_df = prepare_view(be.page((page - 1) * DATA_PAGE_SIZE, DATA_PAGE_SIZE))
 
     cols_to_show = [
         "nom",
@@ -659,34 +692,65 @@ with tab_data:
 
     st.dataframe(df_display, width="stretch", hide_index=True)
 
-    export_cols = [
-        "nom",
-        "categorie",
-        "adresse",
-        "arrondissement",
-        "code_postal",
-        "surface",
-    ]
-    if "annee_ouverture" in view_df.columns:
-        export_cols.append("annee_ouverture")
-    if "presence_cloture" in view_df.columns:
-        export_cols.append("presence_cloture")
-    if "ouverture_24h" in view_df.columns:
-        export_cols.append("ouverture_24h")
-
     st.download_button(
         "⬇️ Télécharger les données (CSV)",
-        data=view_df[export_cols].to_csv(index=False, sep=";"),
+        data=lambda: export_csv(be.version),
         file_name="espaces_verts_paris.csv",
         mime="text/csv",
     )
 
 # ---------------------------------------------------------------------
-# 4. ONGLET STATISTIQUES
+# 5. ONGLET STATISTIQUES
 # ---------------------------------------------------------------------
-with tab_stats:
+@st.cache_data(max_entries=2, show_spinner=False)
+def stats_tables(version):
+    # les graphiques portent sur tout le dataset ; les agrégats passent par le
+    # backend (GROUP BY en SQL avec EV_BACKEND=sqlite, sans charger le CSV)
+    be = backend.get_backend(version=version)
+    tables = {}
+
+    cat_counts = be.group_count(["categorie"]).sort_values("nb", ascending=False, kind="stable")
+    cat_counts.columns = ["Catégorie", "Nb"]
+    tables["cat_counts"] = cat_counts.reset_index(drop=True)
+
+    # surface retenue par load_data.py (déclarée, ou celle du polygone en cas d'écart)
+    df_box = be.select(["categorie", backend.SURFACE_COL])
+    if backend.SURFACE_COL in df_box.columns:
+        # total par catégorie sans double compte des zones communes (cf. overlaps.py)
+        surf = pd.DataFrame({"Catégorie": be.categories})
+        surf["Surface totale"] = [be.total_surface(categories=[c]) or 0 for c in surf["Catégorie"]]
+        tables["surf"] = surf
+
+        # Limiter à 300k pour visualisation
+        df_box = df_box.set_axis(["categorie", "surface"], axis=1)
+        tables["box"] = df_box.assign(surface=df_box["surface"].clip(upper=300000))
+
+    tables["heat"] = be.group_count(["arrondissement_affiche", "categorie"]).rename(columns={"nb": "Nb"})
+
+    open_rate = be.group_mean(["categorie"], "ouverture_24h")
+    if open_rate is not None:
+        open_rate = open_rate.sort_values("ouverture_24h")
+        open_rate["Pourcentage"] = open_rate["ouverture_24h"] * 100
+        tables["open_rate"] = open_rate
+
+    years = be.group_count(["annee_ouverture"])
+    if years is not None:
+        # effectifs par année (quelques centaines de lignes) regroupés par décennie
+        decade = (pd.to_numeric(years["annee_ouverture"], errors="coerce") // 10) * 10
+        decades = years["nb"].groupby(decade).sum().sort_index().reset_index()
+        decades.columns = ["Décennie", "Nombre"]
+
+        # Filtrer pour éviter l'affichage inutile (max = dernière décennie réelle)
+        last_decade = decades["Décennie"].max()
+        tables["decades"] = decades[decades["Décennie"] <= last_decade]
+
+    return tables
+
+
+def render_stats(be):
     import altair as alt
 
+    tables = stats_tables(be.version)
     st.subheader("📈 Statistiques")
 
     # Palettes
@@ -700,8 +764,7 @@ with tab_stats:
     # ------------- DONUT CHART -------------
     st.markdown("## 🟩 Répartition du nombre d'espaces par catégorie")
 
-    cat_counts = df["categorie"].value_counts().reset_index()
-    cat_counts.columns = ["Catégorie", "Nb"]
+    cat_counts = tables["cat_counts"]
 
     donut = alt.Chart(cat_counts).mark_arc(innerRadius=70).encode(
         theta="Nb:Q",
@@ -715,9 +778,8 @@ with tab_stats:
     # ------------- SURFACE PAR CATÉGORIE -------------
     st.markdown("## 🌿 Surface totale par catégorie")
 
-    if "surface_totale_reelle_m2" in df.columns:
-        surf = df.groupby("categorie")["surface_totale_reelle_m2"].sum().reset_index()
-        surf.columns = ["Catégorie", "Surface totale"]
+    if "surf" in tables:
+        surf = tables["surf"]
 
         bars = alt.Chart(surf).mark_bar(color="#27ae60").encode(
             x="Surface totale:Q",
@@ -733,11 +795,7 @@ with tab_stats:
     # ------------- HEATMAP CAT × ARR -------------
     st.markdown("## 🗺️ Répartition par arrondissement")
 
-    heat = (
-        df.groupby(["arrondissement_affiche", "categorie"])
-        .size()
-        .reset_index(name="Nb")
-    )
+    heat = tables["heat"]
 
     heatmap = alt.Chart(heat).mark_rect().encode(
         x=alt.X("arrondissement_affiche:N", title="Arrondissement"),
@@ -752,14 +810,8 @@ with tab_stats:
     # ------------- OUVERT 24H/24 PAR CAT -------------
     st.markdown("## ⭐ Taux d'espaces ouverts 24h/24 par catégorie")
 
-    if "ouverture_24h" in df.columns:
-        open_rate = (
-            df.groupby("categorie")["ouverture_24h"]
-            .mean()
-            .reset_index()
-            .sort_values("ouverture_24h")
-        )
-        open_rate["Pourcentage"] = open_rate["ouverture_24h"] * 100
+    if "open_rate" in tables:
+        open_rate = tables["open_rate"]
 
         scatter = alt.Chart(open_rate).mark_circle(size=200, color="#1e8449").encode(
             x=alt.X("Pourcentage:Q", title="% ouverts 24h/24"),
@@ -775,14 +827,8 @@ with tab_stats:
     # ------------- COURBE + ZONE PAR DÉCENNIE -------------
     st.markdown("## 🕰️ Nombre d'espaces créés par décennie")
 
-    if "annee_ouverture" in df.columns:
-        years = pd.to_numeric(df["annee_ouverture"], errors="coerce").dropna()
-        decades = ((years // 10) * 10).value_counts().sort_index().reset_index()
-        decades.columns = ["Décennie", "Nombre"]
-
-        # Filtrer pour éviter l'affichage inutile (max = dernière décennie réelle)
-        last_decade = decades["Décennie"].max()
-        decades = decades[decades["Décennie"] <= last_decade]
+    if "decades" in tables:
+        decades = tables["decades"]
 
         area = alt.Chart(decades).mark_area(
             color="#2ecc71",
@@ -807,16 +853,36 @@ with tab_stats:
     # ------------- BOX PLOT DES SURFACES -------------
     st.markdown("## 📏 Distribution des surfaces par catégorie")
 
-    if "surface_totale_reelle_m2" in df.columns:
-        # Limiter à 300k pour visualisation
-        df_box = df.copy()
-        df_box["surface_totale_reelle_m2"] = df_box["surface_totale_reelle_m2"].clip(upper=300000)
+    if "box" in tables:
+        df_box = tables["box"]
 
         box = alt.Chart(df_box).mark_boxplot(extent="min-max").encode(
             x=alt.X("categorie:N", title="Catégorie"),
-            y=alt.Y("surface_totale_reelle_m2:Q", title="Surface (m²)", scale=alt.Scale(domain=[0, 300000])),
+            y=alt.Y("surface:Q", title="Surface (m²)", scale=alt.Scale(domain=[0, 300000])),
             color=alt.Color("categorie:N", scale=alt.Scale(range=multi_palette)),
         )
         st.altair_chart(box, use_container_width=True)
     else:
         st.info("Pas de surfaces disponibles.")
+
+
+# =========================
+# Affichage de la section choisie
+# =========================
+RENDERERS = {
+    "🧭 Carte typologique": render_carte_typo,
+    "📜 Carte historique": render_carte_hist,
+    "🟩 Couverture verte": render_couverture,
+    "📋 Données": render_donnees,
+    "📈 Statistiques": render_stats,
+}
+
+section = st.radio(
+    "Section",
+    options=SECTIONS,
+    horizontal=True,
+    key="section",
+    label_visibility="collapsed",
+)
+
+RENDERERS[section](be)
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import shutil
+import threading
+
+# Outils communs aux artefacts dérivés écrits en dossier (partitions/,
+# geometry/, overlaps/, search/) : publication atomique du dossier,
+# cache process des objets ouverts (clé = date du fichier de métadonnées)
+# et empreinte du CSV dont ils dérivent.
+
+
+# =========================
+# Écriture
+# =========================
+def new_tmp_dir(out_dir):
+    # dossier de travail vide à côté de out_dir (même disque : renommage atomique)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def publish_dir(tmp_dir, out_dir):
+    # tmp_dir remplace out_dir par renommages : un lecteur ouvre l'ancien
+    # dossier ou le nouveau, jamais un dossier à moitié écrit
+    old_dir = out_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
+
+
+# =========================
+# Lecture
+# =========================
+_lock = threading.Lock()
+_loaded = {}
+
+
+def cached_by_stat(path, loader):
+    # loader() ouvert une fois par (path, taille, date) ; None si path ou
+    # l'artefact n'existe pas. Un artefact reconstruit est rouvert, la version
+    # précédente reste en cache pour ceux qui la référencent encore.
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if key not in _loaded:
+            try:
+                _loaded[key] = loader()
+            except FileNotFoundError:
+                return None
+            for old in [k for k in _loaded if k[0] == path and k != key][:-1]:
+                _loaded.pop(old)
+        return _loaded[key]
+
+
+def content_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_hash(path):
+    # empreinte du CSV path, recalculée seulement s'il a bougé ; None s'il n'existe pas
+    return cached_by_stat(path, lambda: content_hash(path))
@@ -0,0 +1,346 @@
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+import dataset
+import geostore
+import overlaps
+import partitions
+
+# "pandas" : tout le dataset en mémoire (défaut)
+# "sqlite" : filtres, agrégats et pagination poussés dans la base embarquée,
+#            le process ne garde que les résultats des requêtes
+# "partitions" : une partition CSV par code postal, seules celles de la
+#            sélection (arrondissements / vue) sont lues
+BACKEND = os.environ.get("EV_BACKEND", "pandas")
+
+DB_FILE = "espaces_verts.sqlite"
+DB_PATH = os.path.join(dataset.DATA_DIR, DB_FILE)
+TABLE = "espaces_verts"
+
+INDEXED_COLS = [
+    "categorie",
+    "arrondissement_affiche",
+    "code_postal",
+    "annee_ouverture",
+    "ouverture_24h",
+    "presence_cloture",
+]
+
+BOOL_COLS = ["ouverture_24h", "presence_cloture"]
+
+# colonnes lourdes jamais renvoyées par défaut (tableau Données, export)
+HEAVY_COLS = ["geo_shape", "geo_point", "geometry", "has_geometry"]
+
+# surface retenue par load_data.py (déclarée, ou calculée sur le polygone)
+SURFACE_COL = "surface_m2"
+
+
+# =========================
+# Écriture de la base (appelée par load_data.py)
+# =========================
+def write_database(csv_path=dataset.DATA_PATH, db_path=DB_PATH):
+    df = dataset.add_arrondissement_columns(dataset.read_dataset(csv_path))
+    df = df.reset_index(drop=True)
+    for col in BOOL_COLS:
+        if col in df.columns:
+            df[col] = df[col].map({True: 1, False: 0, "True": 1, "False": 0}).astype("Int64")
+
+    meta = {
+        "categories": sorted(df["categorie"].dropna().unique()),
+        "arrondissements": dataset.arrondissement_options(df),
+    }
+
+    # on écrit à côté puis on remplace : un lecteur ne voit jamais une base à moitié écrite
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        df.to_sql(TABLE, con, index=True, index_label="row_id")
+        for col in INDEXED_COLS:
+            if col in df.columns:
+                con.execute(f"CREATE INDEX idx_{col} ON {TABLE} ({col})")
+        con.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        con.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in meta.items()],
+        )
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, db_path)
+
+
+# =========================
+# Backend pandas (dataset en mémoire)
+# =========================
+def filter_mask(df, categories=None, arrondissements=None, ouverture_24h=None,
+                presence_cloture=None, year_max=None, bbox=None, has_geometry=False):
+    # bbox = [lon_min, lat_min, lon_max, lat_max], testé sur l'emprise de chaque ligne
+    mask = pd.Series(True, index=df.index)
+    if categories:
+        mask &= df["categorie"].isin(categories)
+    if arrondissements:
+        mask &= df["arrondissement_affiche"].isin(arrondissements)
+    if ouverture_24h is not None and "ouverture_24h" in df.columns:
+        mask &= df["ouverture_24h"] == ouverture_24h
+    if presence_cloture is not None and "presence_cloture" in df.columns:
+        mask &= df["presence_cloture"] == presence_cloture
+    if year_max is not None:
+        years = pd.to_numeric(df["annee_ouverture"], errors="coerce")
+        mask &= years.notna() & (years <= year_max)
+    if bbox is not None:
+        lon_min, lat_min, lon_max, lat_max = dataset.feature_bounds(df)
+        mask &= (lon_max >= bbox[0]) & (lon_min <= bbox[2]) & (lat_max >= bbox[1]) & (lat_min <= bbox[3])
+    if has_geometry:
+        mask &= df["has_geometry"]
+    return mask
+
+
+class PandasBackend:
+    # graphe des recouvrements de la version (posé par _load_backend) :
+    # None -> les totaux de surface sont de simples sommes
+    overlaps = None
+
+    def __init__(self, ds):
+        self.ds = ds
+        self.nb_rows = len(ds.df)
+        self.store = ds.store
+        self.categories = ds.categories
+        self.arrondissements = ds.arrondissements
+        self.year_min = ds.year_min
+        self.year_max = ds.year_max
+
+    def _frame(self, **filters):
+        # lignes candidates pour ces filtres (ici : tout le dataset)
+        return self.ds.df
+
+    def _filtered(self, **filters):
+        df = self._frame(**filters)
+        return df[filter_mask(df, **filters)]
+
+    def _columns(self, df, columns):
+        if columns is None:
+            columns = [c for c in df.columns if c not in HEAVY_COLS]
+        elif "geometry" in columns:
+            df = dataset.with_geometry(df, self.store)
+        return df[[c for c in columns if c in df.columns]]
+
+    def select(self, columns=None, **filters):
+        return self._columns(self._filtered(**filters), columns)
+
+    def count(self, **filters):
+        df = self._frame(**filters)
+        return int(filter_mask(df, **filters).sum())
+
+    def total_surface(self, **filters):
+        # surface sans double compte : les zones communes à plusieurs espaces
+        # de la sélection ne sont comptées qu'une fois (cf. overlaps.py)
+        df = self._filtered(**filters)
+        if SURFACE_COL not in df.columns:
+            return None
+        surfaces = df[SURFACE_COL].dropna()
+        if surfaces.empty:
+            return None
+        total = float(surfaces.sum())
+        if self.overlaps is not None:
+            total -= self.overlaps.double_counted(surfaces.index)
+        return total
+
+    def page(self, offset, limit, columns=None, **filters):
+        # géométries reconstruites pour les seules lignes de la page
+        return self._columns(self._filtered(**filters).iloc[offset:offset + limit], columns)
+
+    def group_count(self, by, **filters):
+        # effectif ("nb") par valeur des colonnes by, valeurs manquantes ignorées ;
+        # None si une colonne manque
+        df = self._filtered(**filters)
+        if not set(by) <= set(df.columns):
+            return None
+        return df.groupby(by).size().reset_index(name="nb")
+
+    def group_mean(self, by, column, **filters):
+        df = self._filtered(**filters)
+        if not set(by + [column]) <= set(df.columns):
+            return None
+        return df.groupby(by)[column].mean().reset_index()
+
+
+# =========================
+# Backend partitionné (une partition par code postal, lues à la demande)
+# =========================
+class PartitionedBackend(PandasBackend):
+    def __init__(self, parts):
+        self.parts = parts
+        self.nb_rows = parts.index["count"]
+        self.store = parts.geometry_store
+        self.categories = parts.index["categories"]
+        self.arrondissements = parts.index["arrondissements"]
+        years = [p["years"] for p in parts.index["partitions"] if p["years"]]
+        self.year_min = min(y[0] for y in years) if years else None
+        self.year_max = max(y[1] for y in years) if years else None
+
+    def _frame(self, arrondissements=None, bbox=None, year_max=None, **_):
+        # seules les partitions de la sélection (arrondissements / vue / année) sont lues
+        return self.parts.load(arrondissements, bbox, year_max)
+
+
+# =========================
+# Backend SQLite (requêtes poussées dans la base)
+# =========================
+class SqliteBackend:
+    overlaps = None
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.columns = [r[1] for r in self._conn().execute(f"PRAGMA table_info({TABLE})")]
+        self.nb_rows = self._conn().execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+        store_dir = os.path.join(os.path.dirname(db_path), geostore.GEOMETRY_SUBDIR)
+        self.store = geostore.get_store(
+            store_dir, expected_features=self.nb_rows, csv_path=os.path.join(os.path.dirname(db_path), dataset.DATA_FILE)
+        )
+
+        meta = dict(self._conn().execute("SELECT key, value FROM meta").fetchall())
+        self.categories = json.loads(meta["categories"])
+        self.arrondissements = json.loads(meta["arrondissements"])
+        year_min, year_max = self._conn().execute(
+            f"SELECT MIN(annee_ouverture), MAX(annee_ouverture) FROM {TABLE}"
+        ).fetchone()
+        self.year_min = int(year_min) if year_min is not None else None
+        self.year_max = int(year_max) if year_max is not None else None
+
+    def _conn(self):
+        # une connexion (lecture seule) par thread : Streamlit exécute chaque session dans son thread
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._local.con = con
+        return con
+
+    def _where(self, categories=None, arrondissements=None, ouverture_24h=None,
+               presence_cloture=None, year_max=None, bbox=None, has_geometry=False):
+        clauses, params = [], []
+        if categories:
+            clauses.append(f"categorie IN ({', '.join('?' * len(categories))})")
+            params += list(categories)
+        if arrondissements:
+            clauses.append(f"arrondissement_affiche IN ({', '.join('?' * len(arrondissements))})")
+            params += list(arrondissements)
+        if ouverture_24h is not None:
+            clauses.append("ouverture_24h = ?")
+            params.append(int(ouverture_24h))
+        if presence_cloture is not None:
+            clauses.append("presence_cloture = ?")
+            params.append(int(presence_cloture))
+        if year_max is not None:
+            clauses.append("annee_ouverture <= ?")
+            params.append(int(year_max))
+        if bbox is not None:
+            lon_min, lat_min, lon_max, lat_max = (
+                f"COALESCE({c}, {p})" if c in self.columns else p
+                for c, p in zip(dataset.BBOX_COLS, dataset.POINT_COLS)
+            )
+            clauses.append(f"{lon_max} >= ? AND {lon_min} <= ? AND {lat_max} >= ? AND {lat_min} <= ?")
+            params += [bbox[0], bbox[2], bbox[1], bbox[3]]
+        if has_geometry:
+            clauses.append("geo_shape IS NOT NULL")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def _query(self, columns, where, params, suffix=""):
+        if columns is None:
+            columns = [c for c in self.columns if c not in HEAVY_COLS and c != "row_id"]
+        want_geometry = "geometry" in columns
+        sql_cols = ["row_id"] + [c for c in columns if c in self.columns and c != "row_id"]
+        if want_geometry and self.store is None:
+            sql_cols.append("geo_shape")
+        sql = f"SELECT {', '.join(sql_cols)} FROM {TABLE}{where} ORDER BY row_id{suffix}"
+        # index = ligne du CSV normalisé, comme pour les autres backends
+        df = pd.read_sql_query(sql, self._conn(), params=params).set_index("row_id")
+        df.index.name = None
+
+        for col in BOOL_COLS:
+            if col in df.columns:
+                df[col] = df[col].map({1: True, 0: False})
+        if want_geometry:
+            if self.store is not None:
+                df["geometry"] = self.store.geometries(df.index)
+            else:
+                df["geometry"] = [dataset.parse_geojson(x) for x in df.pop("geo_shape")]
+            df = df[df["geometry"].notna()]
+        return df
+
+    def select(self, columns=None, **filters):
+        where, params = self._where(**filters)
+        return self._query(columns, where, params)
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._conn().execute(f"SELECT COUNT(*) FROM {TABLE}{where}", params).fetchone()[0]
+
+    def total_surface(self, **filters):
+        if SURFACE_COL not in self.columns:
+            return None
+        where, params = self._where(**filters)
+        total = self._conn().execute(
+            f"SELECT SUM({SURFACE_COL}) FROM {TABLE}{where}", params
+        ).fetchone()[0]
+        if total is None or self.overlaps is None:
+            return total
+        # zones communes : seuls les identifiants des lignes remontent de la base
+        where += f"{' AND' if where else ' WHERE'} {SURFACE_COL} IS NOT NULL"
+        ids = [r[0] for r in self._conn().execute(f"SELECT row_id FROM {TABLE}{where}", params)]
+        return total - self.overlaps.double_counted(ids)
+
+    def page(self, offset, limit, columns=None, **filters):
+        where, params = self._where(**filters)
+        return self._query(columns, where, params + [int(limit), int(offset)], " LIMIT ? OFFSET ?")
+
+    def _group(self, by, agg, **filters):
+        # GROUP BY dans la base : seules les lignes agrégées remontent
+        where, params = self._where(**filters)
+        where += f"{' AND' if where else ' WHERE'} " + " AND ".join(f"{c} IS NOT NULL" for c in by)
+        keys = ", ".join(by)
+        sql = f"SELECT {keys}, {agg} FROM {TABLE}{where} GROUP BY {keys} ORDER BY {keys}"
+        return pd.read_sql_query(sql, self._conn(), params=params)
+
+    def group_count(self, by, **filters):
+        if not set(by) <= set(self.columns):
+            return None
+        return self._group(by, "COUNT(*) AS nb", **filters)
+
+    def group_mean(self, by, column, **filters):
+        if not set(by + [column]) <= set(self.columns):
+            return None
+        return self._group(by, f"AVG({column}) AS {column}", **filters)
+
+
+# =========================
+# Backend partagé par process, un par version du dataset (cf. versions.py)
+# =========================
+_backends = {}
+
+
+def _load_backend(kind, version):
+    # chaque version lit les artefacts de sa propre release (cf. dataset.artifacts_dir)
+    base_dir = dataset.artifacts_dir(version)
+    if kind == "sqlite":
+        be = SqliteBackend(os.path.join(base_dir, DB_FILE))
+    elif kind == "partitions":
+        be = PartitionedBackend(partitions.PartitionStore(os.path.join(base_dir, partitions.PARTITIONS_SUBDIR)))
+    else:
+        be = PandasBackend(dataset.get_dataset(version=version))
+    be.version = version
+    be.overlaps = overlaps.get_graph(
+        os.path.join(base_dir, overlaps.OVERLAPS_SUBDIR), expected_features=be.nb_rows
+    )
+    return be
+
+
+def get_backend(kind=BACKEND, version=None):
+    return dataset.get_or_load(_backends, (kind, version), lambda: _load_backend(kind, version))
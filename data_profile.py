@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import dataset
+
+# Profil du CSV normalisé (valeurs manquantes, min / max, valeurs distinctes,
+# histogrammes, plus grandes surfaces, lignes hors Paris), calculé une fois par
+# load_data.py et écrit à côté du CSV : inspect_data.py le lit sans relire le
+# dataset. La taille et la date du CSV profilé permettent de le savoir périmé.
+PROFILE_FILE = "profile.json"
+PROFILE_PATH = os.path.join(dataset.DATA_DIR, PROFILE_FILE)
+
+HEAD_ROWS = 5
+TOP_K = 10
+HIST_MAX_VALUES = 50     # au-delà, pas de comptage par valeur
+HIST_BINS = 10
+
+SURFACE_COLS = ["surface_m2", "surface_totale_reelle_m2", "surface_calculee_m2", "surface_horticole_m2"]
+# colonnes lourdes : ni aperçu ni histogramme
+HEAVY_COLS = ["geo_shape", "geo_point"]
+
+
+def source_stat(csv_path):
+    st = os.stat(csv_path)
+    return {"file": os.path.basename(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def read_csv(csv_path):
+    # même lecture que l'ancien inspect_data.py (types déduits par pandas)
+    return pd.read_csv(csv_path, sep=";", encoding="utf-8")
+
+
+# =========================
+# Construction
+# =========================
+def build_profile(df):
+    light = [c for c in df.columns if c not in HEAVY_COLS]
+
+    columns = {}
+    histograms = {}
+    for col in df.columns:
+        values = df[col]
+        numeric = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+        known = values.dropna()
+        info = {
+            "dtype": str(values.dtype),
+            "non_null": int(len(known)),
+            "nulls": int(len(values) - len(known)),
+            "distinct": int(known.nunique()),
+        }
+        if numeric and len(known):
+            info["min"] = known.min()
+            info["max"] = known.max()
+        columns[col] = info
+
+        if col in HEAVY_COLS or not len(known):
+            continue
+        if not numeric and info["distinct"] <= HIST_MAX_VALUES:
+            counts = known.astype(str).value_counts()
+            histograms[col] = {"values": {k: int(v) for k, v in counts.items()}}
+        elif numeric:
+            counts, edges = np.histogram(known.to_numpy(dtype=float), bins=HIST_BINS)
+            histograms[col] = {"edges": edges.tolist(), "counts": counts.tolist()}
+
+    top = {}
+    for col in SURFACE_COLS:
+        if col in df.columns:
+            rows = df[[c for c in ("nom", "categorie", col) if c in df.columns]].nlargest(TOP_K, col)
+            top[col] = dataset.json_records(rows)
+
+    hors_paris = []
+    if "code_postal" in df.columns:
+        cp = df["code_postal"].astype(str).str.strip()
+        outside = df[~cp.str.startswith("75", na=False)]
+        cols = ["nom", "code_postal", "commune"] + [c for c in df.columns if "adresse" in c.lower()]
+        hors_paris = dataset.json_records(outside[[c for c in cols if c in df.columns]].sort_values("code_postal"))
+
+    return {
+        "rows": int(len(df)),
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+        "columns": columns,
+        "head": dataset.json_records(df[light].head(HEAD_ROWS)),
+        "histograms": histograms,
+        "top": top,
+        "hors_paris": hors_paris,
+    }
+
+
+def profile_csv(csv_path):
+    profile = build_profile(read_csv(csv_path))
+    profile["source"] = source_stat(csv_path)
+    return profile
+
+
+def write_profile(profile, path=PROFILE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, default=dataset.json_default)
+    os.replace(tmp_path, path)
+    return path
+
+
+# =========================
+# Lecture
+# =========================
+def read_profile(path=PROFILE_PATH):
+    # None si load_data.py ne l'a pas (encore) écrit
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def is_fresh(profile, csv_path):
+    # le profil décrit-il bien le CSV présent sur disque ?
+    try:
+        return profile.get("source") == source_stat(csv_path)
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,287 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import geostore
+
+# Les artefacts sont dans une release publiée par load_data.py ou
+# refresh_worker.py : src/releases/<version>/, la release servie étant
+# désignée par le fichier src/current (à défaut, directement dans src/).
+DATA_DIR = "src"
+RELEASES_DIR = os.path.join(DATA_DIR, "releases")
+CURRENT_FILE = os.path.join(DATA_DIR, "current")
+
+# CSV déjà nettoyé par load_data.py (9999 -> NaN)
+DATA_FILE = "espaces_verts_normalized.csv"
+DATA_PATH = os.path.join(DATA_DIR, DATA_FILE)
+
+CP_OUTSIDE = {
+    "92220": "Bagneux (92)",
+    "93210": "Saint-Denis (93)",
+    "93400": "Saint-Ouen (93)",
+    "93500": "Pantin (93)",
+    "94200": "Ivry-sur-Seine (94)",
+    "94300": "Vincennes (94)",
+    "94320": "Thiais (94)",
+}
+
+# "01" -> "1er", "02" -> "2e", ... (toutes les paires de chiffres possibles)
+ARR_LABELS = {f"{n:02d}": ("1er" if n == 1 else f"{n}e") for n in range(100)}
+
+# ordre pour Paris : 1er, 2e, 3e, ..., 20e
+PARIS_ORDER = [ARR_LABELS[f"{n:02d}"] for n in range(1, 21)]
+
+
+@dataclass
+class Dataset:
+    # df est partagé entre toutes les sessions : ne jamais le modifier en place
+    df: pd.DataFrame
+    categories: list
+    arrondissements: list
+    year_min: int | None
+    year_max: int | None
+    # store de géométries mappé de cette version (None -> colonne geometry parsée)
+    store: geostore.GeometryStore | None = None
+    version: str | None = None
+    timings: dict = field(default_factory=dict)
+
+
+@contextmanager
+def timed(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = time.perf_counter() - start
+
+
+def current_release():
+    try:
+        with open(CURRENT_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def artifacts_dir(version=None):
+    # dossier des artefacts d'une version : sa release si elle en a une,
+    # sinon src/ (version None -> release courante)
+    current = current_release()
+    if version is None:
+        version = current
+    if version and os.path.isdir(os.path.join(RELEASES_DIR, version)):
+        return os.path.join(RELEASES_DIR, version)
+    if version and version == current:
+        # src/current désigne une release supprimée : ne pas servir src/ sous son nom
+        raise FileNotFoundError(f"release {version} ({CURRENT_FILE}) introuvable dans {RELEASES_DIR}")
+    return DATA_DIR
+
+
+def read_dataset(path=DATA_PATH):
+    return pd.read_csv(path, sep=";", dtype={"code_postal": "string"})
+
+
+# =========================
+# 🏙️ arrondissement depuis le code postal
+# =========================
+def add_arrondissement_columns(df):
+    cp = df["code_postal"].astype("string").str.strip().fillna("")
+    df["arrondissement"] = cp.str.zfill(5).str[-2:]
+
+    # fallback : la commune si elle est renseignée, sinon le code postal
+    affiche = cp.copy()
+    if "commune" in df.columns:
+        commune = df["commune"].astype("string").str.strip()
+        has_commune = commune.notna() & ~commune.str.lower().isin(["", "nan", "none"])
+        affiche = affiche.mask(has_commune, commune)
+
+    is_paris = cp.str.startswith("75") & df["arrondissement"].str.fullmatch(r"\d\d")
+    affiche = affiche.mask(is_paris, df["arrondissement"].map(ARR_LABELS))
+
+    outside = cp.map(CP_OUTSIDE)
+    affiche = affiche.mask(outside.notna(), outside)
+
+    df["arrondissement_affiche"] = affiche.astype(object)
+    return df
+
+
+# =========================
+# 🏷️ colonnes d'affichage (opérations vectorisées, pas d'apply ligne à ligne)
+# =========================
+ADDRESS_COLS = ["adresse_numero", "adresse_complement", "adresse_type_voie", "adresse_libelle_voie"]
+
+
+def address_text(df):
+    # "12 rue de la Paix" : parties renseignées jointes, espaces normalisés
+    cols = [c for c in ADDRESS_COLS if c in df.columns]
+    if not cols:
+        return pd.Series("", index=df.index)
+    parts = df[cols].astype("string").fillna("")
+    text = parts[cols[0]].str.cat([parts[c] for c in cols[1:]], sep=" ")
+    return text.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def format_thousands(values):
+    # 1234567.8 -> "1 234 567" (partie entière, espace entre les milliers), "" si vide
+    digits = np.trunc(pd.to_numeric(values, errors="coerce")).astype("Int64").astype("string")
+    return digits.str.replace(r"\B(?=(\d{3})+$)", " ", regex=True).fillna("")
+
+
+# =========================
+# Sérialisation JSON (api.py, profil de data_profile.py)
+# =========================
+def json_records(df):
+    # NaN -> null, index (ligne du CSV) -> row_id
+    out = df.astype(object).where(df.notna(), None)
+    out.insert(0, "row_id", df.index)
+    return out.to_dict("records")
+
+
+def json_default(value):
+    # scalaires NumPy -> types Python (json.dump(..., default=json_default))
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} non sérialisable")
+
+
+def parse_geojson(x):
+    if pd.isna(x):
+        return None
+    try:
+        return json.loads(x)
+    except Exception:
+        return None
+
+
+def add_geometry_column(df):
+    # parsing fait une seule fois par process, plus à chaque rerun
+    df["geometry"] = [parse_geojson(x) for x in df["geo_shape"]]
+    df["has_geometry"] = df["geometry"].notna()
+    return df
+
+
+def add_geometry_flags(df, store, row_ids=None):
+    # avec le store mappé (geostore.py) on ne garde qu'un booléen par ligne,
+    # les géométries sont reconstruites à la demande ; sinon on parse geo_shape.
+    # row_ids : pour une partition, lignes correspondantes du CSV complet
+    if store is None:
+        return add_geometry_column(df)
+    df["has_geometry"] = store.has_geometry(df.index if row_ids is None else row_ids)
+    return df
+
+
+def with_geometry(df, store):
+    # ajoute la colonne geometry aux seules lignes demandées (index = ligne du CSV)
+    if "geometry" in df.columns:
+        return df
+    return df.assign(geometry=store.geometries(df.index))
+
+
+# emprise de chaque ligne calculée par load_data.py (lon/lat), le geo_point sinon
+BBOX_COLS = ["bbox_lon_min", "bbox_lat_min", "bbox_lon_max", "bbox_lat_max"]
+POINT_COLS = ["longitude", "latitude", "longitude", "latitude"]
+
+
+def feature_bounds(df):
+    bounds = []
+    for bbox_col, point_col in zip(BBOX_COLS, POINT_COLS):
+        col = df[bbox_col] if bbox_col in df.columns else pd.Series(float("nan"), index=df.index)
+        if point_col in df.columns:
+            col = col.fillna(df[point_col])
+        bounds.append(col)
+    return bounds
+
+
+def arrondissement_options(df):
+    arr_unique = df[["arrondissement_affiche", "code_postal"]].drop_duplicates()
+
+    # on sépare Paris (75xxx) du reste
+    in_paris = arr_unique["code_postal"].astype(str).str.startswith("75")
+    present = set(arr_unique.loc[in_paris, "arrondissement_affiche"])
+    paris_sorted = [a for a in PARIS_ORDER if a in present]
+
+    # pour le hors Paris : on trie par code postal (donc 92..., puis 93..., puis 94...)
+    hors_paris_sorted = (
+        arr_unique[~in_paris].sort_values("code_postal")["arrondissement_affiche"].tolist()
+    )
+    return paris_sorted + hors_paris_sorted
+
+
+def load_dataset(path=DATA_PATH, version=None, timings=None):
+    with timed(timings, "lecture CSV"):
+        df = read_dataset(path)
+
+    with timed(timings, "arrondissements"):
+        add_arrondissement_columns(df)
+
+    with timed(timings, "géométries"):
+        store_dir = os.path.join(os.path.dirname(path), geostore.GEOMETRY_SUBDIR)
+        store = geostore.get_store(store_dir, expected_features=len(df), csv_path=path)
+        add_geometry_flags(df, store)
+
+    with timed(timings, "index dérivés"):
+        categories = sorted(df["categorie"].dropna().unique())
+        arrondissements = arrondissement_options(df)
+        years = pd.Series(dtype=float)
+        if "annee_ouverture" in df.columns:
+            years = pd.to_numeric(df["annee_ouverture"], errors="coerce").dropna()
+        year_min = int(years.min()) if len(years) else None
+        year_max = int(years.max()) if len(years) else None
+
+    return Dataset(
+        df=df,
+        categories=categories,
+        arrondissements=arrondissements,
+        year_min=year_min,
+        year_max=year_max,
+        store=store,
+        version=version,
+        timings=dict(timings or {}),
+    )
+
+
+# =========================
+# Cache process (partagé par toutes les sessions Streamlit)
+# =========================
+# clé = (chemin, version du dataset, cf. versions.py) ; on garde les
+# KEEP_VERSIONS dernières pour que les reruns en cours finissent sur la leur
+KEEP_VERSIONS = 2
+
+_lock = threading.Lock()
+_loading = {}
+_datasets = {}
+
+
+def get_or_load(cache, key, loader, keep=KEEP_VERSIONS):
+    # un verrou par clé : charger une nouvelle version ne bloque pas les
+    # sessions qui lisent encore l'ancienne, et deux sessions ne chargent
+    # jamais la même version en parallèle
+    with _lock:
+        if key in cache:
+            return cache[key]
+        key_lock = _loading.setdefault((id(cache), key), threading.Lock())
+    with key_lock:
+        with _lock:
+            if key in cache:
+                return cache[key]
+        value = loader()
+        with _lock:
+            cache[key] = value
+            # les dicts gardent l'ordre d'insertion : on retire les plus anciennes
+            while len(cache) > keep:
+                cache.pop(next(iter(cache)))
+            _loading.pop((id(cache), key), None)
+        return value
+
+
+def get_dataset(path=None, version=None, timings=None):
+    if path is None:
+        path = os.path.join(artifacts_dir(version), DATA_FILE)
+    return get_or_load(_datasets, (path, version), lambda: load_dataset(path, version, timings))
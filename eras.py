@@ -0,0 +1,181 @@
+import argparse
+import bisect
+import io
+import json
+import os
+import sys
+import threading
+
+# Images d'époque de la carte historique. Les originaux (jusqu'à plusieurs Mo)
+# sont réduits aux largeurs d'affichage et réencodés en WebP une seule fois
+# (python eras.py, ou au premier affichage), avec un manifeste ; les octets sont
+# ensuite gardés en mémoire : un cran du curseur ne relit ni ne réencode rien,
+# et la même image renvoie la même URL (cache navigateur).
+ASSETS_DIR = os.path.join("src", "assets")
+VARIANTS_DIR = os.path.join(ASSETS_DIR, "web")
+MANIFEST_FILE = "manifest.json"
+
+DISPLAY_WIDTHS = (400, 800)
+WEBP_QUALITY = 80
+
+# (dernière année de l'époque, image) ; la dernière vaut pour toutes les années suivantes
+ERAS = [
+    (1715, "louis-xiv.png"),             # 1688–1715 : Louis XIV
+    (1788, "place-louis-xv.jpg"),        # 1716–1788 : Lumières
+    (1799, "rev.jpg"),                   # 1789–1799 : Révolution
+    (1815, "napoleon.jpeg"),             # 1800–1815 : Premier Empire
+    (1852, "monarchie-de-juillet.jpg"),  # 1816–1852 : Restauration / Monarchie de Juillet
+    (1870, "grands-boulevards.jpg"),     # 1853–1870 : Haussmann
+    (1871, "commune-paris.jpg"),         # 1871 : Commune
+    (1900, "eiffel.jpg"),                # 1872–1900 : Belle Époque
+    (1918, "paris-1916.jpg"),            # 1901–1918 : modernité + WW1
+    (1939, "paris-1930.jpeg"),           # 1919–1939 : entre-deux-guerres
+    (1944, "paris-1940.jpeg"),           # 1940–1944 : occupation
+    (1945, "paris-liberation.jpeg"),     # 1945 : libération
+    (1970, "trente-glorieuses.jpg"),     # 1946–1970 : reconstruction & modernisation
+    (2000, "paris-1980.jpg"),            # 1971–2000 : Paris contemporain
+    (2010, "paris-2000.jpeg"),           # 2001–2010 : Paris contemporain
+    (None, "paris-2025.jpg"),            # 2011– : Paris durable
+]
+ERA_ENDS = [end for end, _ in ERAS[:-1]]
+
+
+def era_for_year(year):
+    return ERAS[bisect.bisect_left(ERA_ENDS, year)][1]
+
+
+# =========================
+# Variantes WebP + manifeste
+# =========================
+def _source_stat(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def variant_name(name, width):
+    return f"{os.path.splitext(name)[0]}-{width}.webp"
+
+
+def encode_variant(path, width):
+    from PIL import Image
+
+    with Image.open(path) as im:
+        im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+        if im.width > width:
+            im = im.resize((width, round(im.height * width / im.width)), Image.LANCZOS)
+        buf = io.BytesIO()
+        im.save(buf, format="WEBP", quality=WEBP_QUALITY, method=6)
+        return buf.getvalue(), im.size
+
+
+def read_manifest(variants_dir=VARIANTS_DIR):
+    try:
+        with open(os.path.join(variants_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _is_fresh(entry, source, variants_dir, widths):
+    return (
+        entry is not None
+        and entry.get("source") == source
+        and all(
+            str(w) in entry["variants"]
+            and os.path.exists(os.path.join(variants_dir, entry["variants"][str(w)]["file"]))
+            for w in widths
+        )
+    )
+
+
+_build_lock = threading.Lock()
+
+
+def build_variants(names=None, widths=DISPLAY_WIDTHS, assets_dir=ASSETS_DIR,
+                   variants_dir=VARIANTS_DIR, force=False):
+    # (re)construit les variantes manquantes ou périmées, puis réécrit le manifeste
+    names = [name for _, name in ERAS] if names is None else names
+    with _build_lock:
+        os.makedirs(variants_dir, exist_ok=True)
+        manifest = read_manifest(variants_dir)
+        changed = False
+        for name in names:
+            path = os.path.join(assets_dir, name)
+            source = _source_stat(path)
+            if not force and _is_fresh(manifest.get(name), source, variants_dir, widths):
+                continue
+            entry = {"source": source, "variants": {}}
+            for width in widths:
+                data, (w, h) = encode_variant(path, width)
+                file = variant_name(name, width)
+                tmp_path = os.path.join(variants_dir, file + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, os.path.join(variants_dir, file))
+                entry["variants"][str(width)] = {"file": file, "bytes": len(data), "width": w, "height": h}
+            manifest[name] = entry
+            changed = True
+
+        if changed:
+            tmp_path = os.path.join(variants_dir, MANIFEST_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, os.path.join(variants_dir, MANIFEST_FILE))
+        return manifest
+
+
+# =========================
+# Octets en mémoire (une lecture par image et par process)
+# =========================
+_lock = threading.Lock()
+_bytes = {}
+
+
+def image_bytes(name, width=800):
+    key = (name, width)
+    with _lock:
+        if key in _bytes:
+            return _bytes[key]
+
+    entry = read_manifest().get(name)
+    source = _source_stat(os.path.join(ASSETS_DIR, name))
+    if not _is_fresh(entry, source, VARIANTS_DIR, [width]):
+        entry = build_variants([name])[name]
+    with open(os.path.join(VARIANTS_DIR, entry["variants"][str(width)]["file"]), "rb") as f:
+        data = f.read()
+
+    with _lock:
+        _bytes[key] = data
+    return data
+
+
+def era_image(year, width=800):
+    return image_bytes(era_for_year(year), width)
+
+
+def warm(width=800):
+    # appelé au démarrage (warmup.py) : variantes construites et toutes en mémoire
+    build_variants()
+    for _, name in ERAS:
+        image_bytes(name, width)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Variantes WebP des images d'époque")
+    parser.add_argument("--force", action="store_true", help="tout réencoder")
+    args = parser.parse_args(argv)
+
+    manifest = build_variants(force=args.force)
+    total_src = total_web = 0
+    for _, name in ERAS:
+        entry = manifest[name]
+        sizes = ", ".join(f"{w} px : {v['bytes'] / 1024:.0f} Ko" for w, v in entry["variants"].items())
+        print(f"{name:<28} {entry['source']['size'] / 1024:7.0f} Ko -> {sizes}")
+        total_src += entry["source"]["size"]
+        total_web += entry["variants"][str(max(DISPLAY_WIDTHS))]["bytes"]
+    print(f"✅ {total_src / 1e6:.1f} Mo d'originaux -> {total_web / 1e6:.1f} Mo affichés à {max(DISPLAY_WIDTHS)} px")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
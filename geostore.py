@@ -0,0 +1,283 @@
+import json
+import os
+
+import numpy as np
+
+import artifacts
+
+# Toutes les géométries dans un seul buffer de coordonnées + tableaux d'offsets
+# (features -> parties -> anneaux -> sommets), ouverts en mémoire mappée :
+# les workers Streamlit d'une même machine partagent une seule copie physique
+# (page cache) au lieu de garder chacun des dicts GeoJSON parsés.
+GEOMETRY_SUBDIR = "geometry"
+GEOMETRY_DIR = os.path.join("src", GEOMETRY_SUBDIR)
+META_FILE = "meta.json"
+
+# type GeoJSON -> code stocké (0 = pas de géométrie exploitable)
+GEOM_TYPES = {
+    "Polygon": 1,
+    "MultiPolygon": 2,
+    "LineString": 3,
+    "MultiLineString": 4,
+    "Point": 5,
+    "MultiPoint": 6,
+}
+GEOM_NAMES = {code: name for name, code in GEOM_TYPES.items()}
+
+
+def geometry_parts(geom):
+    # toute géométrie devient une liste de parties, chaque partie une liste d'anneaux
+    t, coords = geom["type"], geom["coordinates"]
+    if t == "Polygon":
+        return [coords]
+    if t == "MultiPolygon":
+        return coords
+    if t == "LineString":
+        return [[coords]]
+    if t == "MultiLineString":
+        return [[line] for line in coords]
+    if t == "Point":
+        return [[[coords]]]
+    if t == "MultiPoint":
+        return [[[pt]] for pt in coords]
+    raise ValueError(f"type de géométrie non géré : {t}")
+
+
+def rebuild_geometry(code, parts):
+    t = GEOM_NAMES[code]
+    if t == "Polygon":
+        coords = parts[0]
+    elif t == "MultiPolygon":
+        coords = parts
+    elif t == "LineString":
+        coords = parts[0][0]
+    elif t == "MultiLineString":
+        coords = [p[0] for p in parts]
+    elif t == "Point":
+        coords = parts[0][0][0]
+    else:
+        coords = [p[0][0] for p in parts]
+    return {"type": t, "coordinates": coords}
+
+
+# =========================
+# Écriture (appelée par load_data.py)
+# =========================
+def pack_geometries(geometries):
+    # geometries : une géométrie GeoJSON (dict) ou None par ligne du CSV normalisé
+    types = np.zeros(len(geometries), dtype=np.int8)
+    feature_offsets = [0]
+    part_offsets = [0]
+    ring_offsets = [0]
+    coords = []
+
+    for i, geom in enumerate(geometries):
+        if geom is not None:
+            try:
+                parts = geometry_parts(geom)
+                types[i] = GEOM_TYPES[geom["type"]]
+            except (KeyError, TypeError, ValueError):
+                parts = []
+            for part in parts:
+                for ring in part:
+                    coords.extend(pt[:2] for pt in ring)
+                    ring_offsets.append(len(coords))
+                part_offsets.append(len(ring_offsets) - 1)
+        feature_offsets.append(len(part_offsets) - 1)
+
+    return {
+        "types": types,
+        "feature_offsets": np.asarray(feature_offsets, dtype=np.int64),
+        "part_offsets": np.asarray(part_offsets, dtype=np.int64),
+        "ring_offsets": np.asarray(ring_offsets, dtype=np.int64),
+        "coords": np.asarray(coords, dtype=np.float64).reshape(-1, 2),
+    }
+
+
+def write_store(geometries, out_dir=GEOMETRY_DIR, source=None):
+    # geometries : liste de géométries (cf. pack_geometries) ou tableaux déjà construits ;
+    # source : empreinte du CSV normalisé dont les lignes sont alignées sur le store
+    arrays = geometries if isinstance(geometries, dict) else pack_geometries(geometries)
+
+    tmp_dir = artifacts.new_tmp_dir(out_dir)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+    meta = {
+        "features": int(len(arrays["types"])),
+        "vertices": int(len(arrays["coords"])),
+        "rings": int(len(arrays["ring_offsets"]) - 1),
+        "source": source,
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    artifacts.publish_dir(tmp_dir, out_dir)
+    return meta
+
+
+# =========================
+# Métriques des polygones (Lambert-93, en une passe NumPy)
+# =========================
+# projection conique conforme de Lambert-93 (EPSG:2154, ellipsoïde GRS80)
+L93_A = 6378137.0
+L93_E = 0.0818191910428158
+L93_LON0 = np.radians(3.0)
+L93_X0, L93_Y0 = 700000.0, 6600000.0
+
+
+def _l93_m(lat):
+    return np.cos(lat) / np.sqrt(1 - (L93_E * np.sin(lat)) ** 2)
+
+
+def _l93_t(lat):
+    es = L93_E * np.sin(lat)
+    return np.tan(np.pi / 4 - lat / 2) / ((1 - es) / (1 + es)) ** (L93_E / 2)
+
+
+_LAT1, _LAT2, _LAT0 = np.radians([44.0, 49.0, 46.5])
+L93_N = (np.log(_l93_m(_LAT1)) - np.log(_l93_m(_LAT2))) / (np.log(_l93_t(_LAT1)) - np.log(_l93_t(_LAT2)))
+L93_AF = L93_A * _l93_m(_LAT1) / (L93_N * _l93_t(_LAT1) ** L93_N)
+L93_RHO0 = L93_AF * _l93_t(_LAT0) ** L93_N
+
+
+def to_lambert93(lon, lat):
+    rho = L93_AF * _l93_t(np.radians(lat)) ** L93_N
+    theta = L93_N * (np.radians(lon) - L93_LON0)
+    return L93_X0 + rho * np.sin(theta), L93_Y0 + L93_RHO0 - rho * np.cos(theta)
+
+
+def from_lambert93(x, y, iterations=6):
+    dx, dy = x - L93_X0, L93_RHO0 - (y - L93_Y0)
+    t = (np.hypot(dx, dy) / L93_AF) ** (1 / L93_N)
+    lat = np.pi / 2 - 2 * np.arctan(t)
+    for _ in range(iterations):
+        es = L93_E * np.sin(lat)
+        lat = np.pi / 2 - 2 * np.arctan(t * ((1 - es) / (1 + es)) ** (L93_E / 2))
+    lon = np.arctan2(dx, dy) / L93_N + L93_LON0
+    return np.degrees(lon), np.degrees(lat)
+
+
+def _sum_by(values, offsets):
+    # somme de values par segment [offsets[i], offsets[i+1]) (segments vides -> 0)
+    totals = np.add.reduceat(np.append(values, 0.0), offsets[:-1]) if len(offsets) > 1 else np.zeros(0)
+    return np.where(np.diff(offsets) > 0, totals, 0.0)
+
+
+def feature_metrics(arrays):
+    # arrays : tableaux construits par pack_geometries.
+    # Surface (m²), périmètre (m), centroïde et emprise (lon/lat) de chaque ligne ;
+    # NaN pour les lignes sans polygone.
+    types = np.asarray(arrays["types"])
+    feature_offsets = np.asarray(arrays["feature_offsets"])
+    part_offsets = np.asarray(arrays["part_offsets"])
+    ring_offsets = np.asarray(arrays["ring_offsets"])
+    coords = np.asarray(arrays["coords"])
+    n_features, n_rings = len(types), len(ring_offsets) - 1
+
+    x, y = to_lambert93(coords[:, 0], coords[:, 1])
+    # segment i -> i+1, sauf d'un anneau au suivant (les anneaux sont fermés)
+    x1, y1 = np.roll(x, -1), np.roll(y, -1)
+    last = np.zeros(len(coords), dtype=bool)
+    last[ring_offsets[1:] - 1] = True
+    cross = np.where(last, 0.0, x * y1 - x1 * y)
+    seg_len = np.where(last, 0.0, np.hypot(x1 - x, y1 - y))
+
+    ring_area = _sum_by(cross, ring_offsets) / 2
+    ring_mx = _sum_by((x + x1) * cross, ring_offsets) / 6
+    ring_my = _sum_by((y + y1) * cross, ring_offsets) / 6
+    ring_len = _sum_by(seg_len, ring_offsets)
+
+    # premier anneau d'une partie = extérieur, les suivants = trous
+    ring_ids = np.arange(n_rings)
+    ring_part = np.searchsorted(part_offsets, ring_ids, side="right") - 1
+    outer = ring_ids == part_offsets[ring_part]
+    sign = np.sign(ring_area) * np.where(outer, 1.0, -1.0)
+    ring_feature = np.searchsorted(feature_offsets, ring_part, side="right") - 1
+
+    area = np.bincount(ring_feature, sign * ring_area, minlength=n_features)
+    mx = np.bincount(ring_feature, sign * ring_mx, minlength=n_features)
+    my = np.bincount(ring_feature, sign * ring_my, minlength=n_features)
+    perimeter = np.bincount(ring_feature, ring_len, minlength=n_features)
+
+    is_polygon = np.isin(types, [GEOM_TYPES["Polygon"], GEOM_TYPES["MultiPolygon"]]) & (area > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cx, cy = from_lambert93(mx / area, my / area)
+
+    # emprise en lon/lat sur les sommets de chaque ligne
+    vertex_offsets = ring_offsets[part_offsets[feature_offsets]]
+    has_vertices = np.diff(vertex_offsets) > 0
+    bbox = np.full((n_features, 4), np.nan)
+    if has_vertices.any():
+        # débuts strictement croissants : chaque segment s'arrête au début du suivant
+        starts = vertex_offsets[:-1][has_vertices]
+        bbox[has_vertices, :2] = np.minimum.reduceat(coords, starts)
+        bbox[has_vertices, 2:] = np.maximum.reduceat(coords, starts)
+
+    nan = np.full(n_features, np.nan)
+    return {
+        "surface_geo_m2": np.where(is_polygon, area, nan),
+        "perimetre_geo_m": np.where(is_polygon, perimeter, nan),
+        "centre_lon": np.where(is_polygon, cx, nan),
+        "centre_lat": np.where(is_polygon, cy, nan),
+        "bbox_lon_min": bbox[:, 0],
+        "bbox_lat_min": bbox[:, 1],
+        "bbox_lon_max": bbox[:, 2],
+        "bbox_lat_max": bbox[:, 3],
+    }
+
+
+# =========================
+# Lecture (mémoire mappée)
+# =========================
+class GeometryStore:
+    def __init__(self, store_dir=GEOMETRY_DIR):
+        with open(os.path.join(store_dir, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r")
+
+        self.types = load("types")
+        self.feature_offsets = load("feature_offsets")
+        self.part_offsets = load("part_offsets")
+        self.ring_offsets = load("ring_offsets")
+        self.coords = load("coords")
+
+    def __len__(self):
+        return self.meta["features"]
+
+    def has_geometry(self, ids=None):
+        types = self.types if ids is None else self.types[np.asarray(ids, dtype=np.int64)]
+        return np.asarray(types) != 0
+
+    def geometry(self, i):
+        code = int(self.types[i])
+        if code == 0:
+            return None
+        parts = []
+        for p in range(self.feature_offsets[i], self.feature_offsets[i + 1]):
+            rings = []
+            for r in range(self.part_offsets[p], self.part_offsets[p + 1]):
+                start, end = self.ring_offsets[r], self.ring_offsets[r + 1]
+                rings.append(self.coords[start:end].tolist())
+            parts.append(rings)
+        return rebuild_geometry(code, parts)
+
+    def geometries(self, ids):
+        # ids = index de lignes du CSV normalisé (index des DataFrames du backend)
+        return [self.geometry(int(i)) for i in ids]
+
+
+def get_store(store_dir=GEOMETRY_DIR, expected_features=None, csv_path=None):
+    # None si le store n'a pas été construit (ou ne correspond pas au dataset) :
+    # les appelants retombent alors sur le parsing de geo_shape.
+    # csv_path : le store doit avoir été écrit pour ce CSV (même contenu), pas
+    # seulement pour le même nombre de lignes.
+    # Rouvert quand meta.json change (cf. artifacts.cached_by_stat)
+    store = artifacts.cached_by_stat(os.path.join(store_dir, META_FILE), lambda: GeometryStore(store_dir))
+    if store is None or (expected_features is not None and len(store) != expected_features):
+        return None
+    source = artifacts.source_hash(csv_path) if csv_path is not None else None
+    if source is not None and store.meta.get("source") != source:
+        return None
+    return store
@@ -0,0 +1,277 @@
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import geostore
+
+# Couverture verte : tous les polygones rasterisés sur une grille fine (~10 m)
+# par balayage de lignes vectorisé (intersections arêtes x lignes de pixels
+# calculées d'un coup en NumPy, puis remplissage pair-impair par cumsum).
+# Résultat agrégé en % de verdure par maille d'affichage et par arrondissement,
+# mis en cache sur disque par version du dataset et par jeu de filtres.
+COVERAGE_SUBDIR = "coverage"
+
+CELL_M = 10              # pixel de calcul
+DISPLAY_CELL_M = 200     # maille affichée (% de verdure de la maille)
+
+# superficies officielles des arrondissements (km², bois compris pour 12e / 16e)
+ARR_AREAS_KM2 = {
+    "1er": 1.83, "2e": 0.99, "3e": 1.17, "4e": 1.60, "5e": 2.54,
+    "6e": 2.15, "7e": 4.09, "8e": 3.88, "9e": 2.18, "10e": 2.89,
+    "11e": 3.67, "12e": 16.32, "13e": 7.15, "14e": 5.64, "15e": 8.50,
+    "16e": 16.37, "17e": 5.67, "18e": 6.01, "19e": 6.79, "20e": 5.98,
+}
+
+# dégradé blanc -> vert foncé pour l'image de couverture
+RAMP = np.array([[237, 248, 233], [161, 217, 155], [65, 171, 93], [0, 109, 44]], dtype=float)
+
+
+# =========================
+# Grille
+# =========================
+def meters_per_degree(lat):
+    # longueur (m) d'un degré de longitude / latitude sur l'ellipsoïde GRS80
+    phi = np.radians(lat)
+    w = np.sqrt(1 - (geostore.L93_E * np.sin(phi)) ** 2)
+    k = np.pi / 180 * geostore.L93_A
+    return k * np.cos(phi) / w, k * (1 - geostore.L93_E ** 2) / w ** 3
+
+
+def make_grid(coords, cell_m=CELL_M, display_cell_m=DISPLAY_CELL_M):
+    # grille lon/lat couvrant tous les sommets, en nombre entier de mailles d'affichage
+    lon_min, lat_min = coords.min(axis=0)
+    lon_max, lat_max = coords.max(axis=0)
+    m_lon, m_lat = meters_per_degree((lat_min + lat_max) / 2)
+    dlat = cell_m / m_lat
+    dlon = cell_m / m_lon
+    block = max(1, round(display_cell_m / cell_m))
+    width = int(np.ceil((lon_max - lon_min) / dlon / block)) * block
+    height = int(np.ceil((lat_max - lat_min) / dlat / block)) * block
+    return {
+        "lon_min": float(lon_min), "lat_min": float(lat_min),
+        "dlon": float(dlon), "dlat": float(dlat),
+        "width": width, "height": height, "block": block,
+    }
+
+
+def grid_bounds(grid):
+    return [
+        grid["lon_min"],
+        grid["lat_min"],
+        grid["lon_min"] + grid["width"] * grid["dlon"],
+        grid["lat_min"] + grid["height"] * grid["dlat"],
+    ]
+
+
+def pixel_areas(grid):
+    # surface (m²) d'un pixel de chaque ligne (dépend de la latitude)
+    lat = grid["lat_min"] + (np.arange(grid["height"]) + 0.5) * grid["dlat"]
+    m_lon, m_lat = meters_per_degree(lat)
+    return (grid["dlon"] * m_lon) * (grid["dlat"] * m_lat)
+
+
+# =========================
+# Rasterisation (balayage vectorisé)
+# =========================
+def polygon_spans(arrays, grid):
+    # -> (feature, ligne, colonne début, colonne fin) des segments intérieurs
+    types = np.asarray(arrays["types"])
+    feature_offsets = np.asarray(arrays["feature_offsets"])
+    part_offsets = np.asarray(arrays["part_offsets"])
+    ring_offsets = np.asarray(arrays["ring_offsets"])
+    coords = np.asarray(arrays["coords"])
+
+    # feature de chaque sommet : sommet -> anneau -> partie -> feature
+    ring_part = np.repeat(np.arange(len(part_offsets) - 1), np.diff(part_offsets))
+    part_feature = np.repeat(np.arange(len(feature_offsets) - 1), np.diff(feature_offsets))
+    vertex_ring = np.repeat(np.arange(len(ring_offsets) - 1), np.diff(ring_offsets))
+    vertex_part = ring_part[vertex_ring]
+    vertex_feature = part_feature[vertex_part]
+
+    # arêtes i -> i+1 à l'intérieur d'un anneau, polygones uniquement
+    polygon = np.isin(types, [geostore.GEOM_TYPES["Polygon"], geostore.GEOM_TYPES["MultiPolygon"]])
+    keep = np.ones(len(coords), dtype=bool)
+    keep[ring_offsets[1:] - 1] = False
+    keep &= polygon[vertex_feature]
+    edges = np.flatnonzero(keep)
+
+    x = (coords[:, 0] - grid["lon_min"]) / grid["dlon"]
+    y = (coords[:, 1] - grid["lat_min"]) / grid["dlat"]
+    x0, y0, x1, y1 = x[edges], y[edges], x[edges + 1], y[edges + 1]
+    feature = vertex_feature[edges]
+    part = vertex_part[edges]
+
+    # lignes de pixels dont le centre (r + 0.5) est dans [ymin, ymax)
+    first = np.ceil(np.minimum(y0, y1) - 0.5).astype(np.int64)
+    last = np.ceil(np.maximum(y0, y1) - 0.5).astype(np.int64)
+    counts = np.maximum(last - first, 0)
+    edge_ids = np.repeat(np.arange(len(edges)), counts)
+    rows = first[edge_ids] + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+
+    yc = rows + 0.5
+    t = (yc - y0[edge_ids]) / (y1[edge_ids] - y0[edge_ids])
+    xc = x0[edge_ids] + t * (x1[edge_ids] - x0[edge_ids])
+    feat = feature[edge_ids]
+
+    # règle pair-impair par partie (les trous s'annulent, deux parties qui se
+    # chevauchent restent couvertes) : croisements triés par (partie, ligne, x)
+    order = np.lexsort((xc, rows, part[edge_ids]))
+    xc, rows, feat = xc[order], rows[order], feat[order]
+    start = np.ceil(xc[0::2] - 0.5).astype(np.int64)
+    end = np.ceil(xc[1::2] - 0.5).astype(np.int64)
+    rows, feat = rows[0::2], feat[0::2]
+
+    inside = (rows >= 0) & (rows < grid["height"])
+    start = np.clip(start, 0, grid["width"])
+    end = np.clip(end, 0, grid["width"])
+    inside &= end > start
+    return feat[inside], rows[inside], start[inside], end[inside]
+
+
+def fill_spans(rows, start, end, grid):
+    # pixels couverts par au moins un segment (+1 au début, -1 à la fin, cumsum)
+    diff = np.zeros((grid["height"], grid["width"] + 1), dtype=np.int32)
+    np.add.at(diff, (rows, start), 1)
+    np.add.at(diff, (rows, end), -1)
+    return np.cumsum(diff, axis=1)[:, :-1] > 0
+
+
+def covered_areas(groups, rows, start, end, grid, n_groups):
+    # surface couverte (m²) par groupe, union des segments du groupe (sans double
+    # compte), directement sur les segments : pas de raster par groupe.
+    # Segments triés par (groupe, ligne, début) ; chaque segment n'apporte que
+    # la partie au-delà de la plus grande fin des segments précédents de sa ligne.
+    line = groups.astype(np.int64) * grid["height"] + rows
+    order = np.lexsort((start, line))
+    line, rows, start, end = line[order], rows[order], start[order], end[order]
+    # fins décalées par ligne : le cumul max ne déborde pas d'une ligne à la suivante
+    stride = grid["width"] + 1
+    reach = np.maximum.accumulate(line * stride + end)
+    prev_end = np.concatenate([[-1], reach[:-1]]) - line * stride
+    pixels = np.maximum(end - np.maximum(start, prev_end), 0)
+    return np.bincount(groups[order], weights=pixels * pixel_areas(grid)[rows], minlength=n_groups)
+
+
+def block_mean(mask, block):
+    h, w = mask.shape
+    return mask.reshape(h // block, block, w // block, block).mean(axis=(1, 3))
+
+
+def compute_coverage(df, arrays):
+    # df : une ligne par feature de arrays (arrondissement_affiche)
+    grid = make_grid(np.asarray(arrays["coords"]))
+    feat, rows, start, end = polygon_spans(arrays, grid)
+
+    cover = fill_spans(rows, start, end, grid)
+    areas = pixel_areas(grid)
+
+    # par arrondissement : union des polygones de l'arrondissement (sans double compte)
+    codes, labels = pd.factorize(df["arrondissement_affiche"].to_numpy()[feat])
+    known = codes >= 0
+    green = covered_areas(codes[known], rows[known], start[known], end[known], grid, len(labels))
+    stats = []
+    for label, green_m2 in zip(labels, green.tolist()):
+        area_km2 = ARR_AREAS_KM2.get(label)
+        stats.append({
+            "arrondissement_affiche": label,
+            "surface_verte_m2": round(green_m2),
+            "couverture_pct": round(100 * green_m2 / (area_km2 * 1e6), 2) if area_km2 else None,
+        })
+
+    return {
+        "grid": grid,
+        "bounds": grid_bounds(grid),
+        # ligne 0 = sud : on retourne pour avoir le nord en haut de l'image
+        "cells": block_mean(cover, grid["block"])[::-1].astype(np.float32),
+        "green_m2": float((cover.sum(axis=1) * areas).sum()),
+        "pixels": int(cover.size),
+        "arrondissements": stats,
+    }
+
+
+def coverage_png(cells):
+    # % de verdure par maille -> image RGBA (transparente là où il n'y a rien)
+    from PIL import Image
+
+    pos = np.clip(cells, 0, 1) * (len(RAMP) - 1)
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, len(RAMP) - 1)
+    frac = (pos - lo)[..., None]
+    rgb = RAMP[lo] * (1 - frac) + RAMP[hi] * frac
+    alpha = np.where(cells > 0, 90 + 140 * np.clip(cells, 0, 1), 0)[..., None]
+    rgba = np.concatenate([rgb, alpha], axis=-1).astype(np.uint8)
+
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+# =========================
+# Cache disque (par version + filtres)
+# =========================
+def filters_key(categories=None, year_max=None):
+    payload = json.dumps({"categories": sorted(categories or []), "year_max": year_max})
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def cache_path(version, categories=None, year_max=None):
+    cache_dir = os.path.join(dataset.artifacts_dir(version), COVERAGE_SUBDIR)
+    return os.path.join(cache_dir, f"{version}-{filters_key(categories, year_max)}.npz")
+
+
+def _save(path, result, png):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = {k: result[k] for k in ("grid", "bounds", "green_m2", "pixels", "arrondissements")}
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        cells=result["cells"],
+        png=np.frombuffer(png, dtype=np.uint8),
+        meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+    )
+    os.replace(tmp_path, path)
+
+    # les rasters des anciennes versions ne serviront plus ; seuls les fichiers
+    # terminés sont retirés (un .tmp.npz peut être en cours d'écriture par un
+    # autre process, pour cette version ou une autre)
+    prefix = os.path.basename(path).split("-")[0] + "-"
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(prefix) or not name.endswith(".npz") or name.endswith(".tmp.npz"):
+            continue
+        try:
+            os.remove(os.path.join(os.path.dirname(path), name))
+        except FileNotFoundError:
+            pass
+
+
+def _load(path):
+    with np.load(path) as data:
+        result = json.loads(data["meta"].tobytes())
+        result["cells"] = data["cells"]
+        return result, data["png"].tobytes()
+
+
+def get_coverage(be, categories=None, year_max=None):
+    # -> (résultat, image PNG) ; calculé au premier appel pour ces filtres, lu sur disque ensuite
+    path = cache_path(be.version, categories, year_max)
+    if os.path.exists(path):
+        return _load(path)
+
+    df = be.select(
+        ["arrondissement_affiche", "geometry"],
+        categories=categories,
+        year_max=year_max,
+        has_geometry=True,
+    )
+    if df.empty:
+        return None, None
+    arrays = geostore.pack_geometries(df["geometry"].tolist())
+    result = compute_coverage(df, arrays)
+    png = coverage_png(result["cells"])
+    _save(path, result, png)
+    return result, png
@@ -0,0 +1,90 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+import dataset
+
+# Index d'intervalles pour la carte historique : chaque espace a au plus trois
+# dates (ouverture, changement de nom, rénovation) qui découpent le temps en
+# intervalles d'état constant. On trie une fois les lignes par chacune de ces
+# dates : "état à l'année Y" = trois bisect + des préfixes de tableaux triés.
+# Toutes les années entre deux événements donnent le même état : les caches de
+# l'app sont clés par le dernier événement (as_of), pas par année du curseur.
+HISTORY_COLS = ["nom", "ancien_nom", "annee_ouverture", "annee_changement_nom", "annee_renovation"]
+
+
+def _sorted_years(values):
+    # (années triées, lignes correspondantes) pour les valeurs renseignées
+    years = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    known = np.flatnonzero(~np.isnan(years))
+    order = known[np.argsort(years[known], kind="stable")]
+    return years[order].astype(int).tolist(), order
+
+
+class HistoryIndex:
+    def __init__(self, df):
+        # df : une ligne par espace vert, index = identifiant de ligne du backend
+        self.row_ids = df.index.to_numpy()
+        self.nom = df["nom"].to_numpy(dtype=object)
+        has_old = df["ancien_nom"].notna() if "ancien_nom" in df.columns else pd.Series(False, index=df.index)
+        self.ancien_nom = df["ancien_nom"].to_numpy(dtype=object) if "ancien_nom" in df.columns else None
+
+        def col(name):
+            return df[name] if name in df.columns else pd.Series(np.nan, index=df.index)
+
+        self.open_years, self.open_order = _sorted_years(col("annee_ouverture"))
+        # changement de nom : seulement si un ancien nom est connu
+        self.rename_years, self.rename_order = _sorted_years(col("annee_changement_nom").where(has_old))
+        self.renov_years, self.renov_order = _sorted_years(col("annee_renovation"))
+        self.renov_year_of_row = pd.to_numeric(col("annee_renovation"), errors="coerce").to_numpy()
+        # ancien nom utilisable : connu, avec l'année où il a été abandonné
+        self.has_rename = np.zeros(len(df), dtype=bool)
+        self.has_rename[self.rename_order] = True
+
+        self.events = sorted(set(self.open_years) | set(self.rename_years) | set(self.renov_years))
+
+    def as_of(self, year):
+        # dernière année d'événement <= year : même état pour toutes les années jusqu'au suivant
+        k = bisect.bisect_right(self.events, year)
+        return self.events[k - 1] if k else None
+
+    def state(self, year):
+        # -> DataFrame (index = identifiant de ligne) des espaces ouverts à cette année,
+        #    avec le nom porté alors et l'état de rénovation
+        n = len(self.row_ids)
+        opened = self.open_order[:bisect.bisect_right(self.open_years, year)]
+
+        renamed = np.zeros(n, dtype=bool)
+        renamed[self.rename_order[:bisect.bisect_right(self.rename_years, year)]] = True
+        renovated = np.zeros(n, dtype=bool)
+        renovated[self.renov_order[:bisect.bisect_right(self.renov_years, year)]] = True
+
+        # ancien nom tant que le changement (d'année connue) n'a pas eu lieu ;
+        # sans année de changement, on ne sait pas quand il valait : nom actuel
+        use_old = self.has_rename[opened] & ~renamed[opened]
+        names = self.nom[opened].copy()
+        if self.ancien_nom is not None:
+            names[use_old] = self.ancien_nom[opened][use_old]
+
+        return pd.DataFrame(
+            {
+                "nom_epoque": names,
+                "nom_actuel": self.nom[opened],
+                "renomme_depuis": use_old,
+                "renove": renovated[opened],
+                "annee_renovation": self.renov_year_of_row[opened],
+            },
+            index=self.row_ids[opened],
+        )
+
+
+_indexes = {}
+
+
+def get_history(be):
+    # un index par version du dataset, construit sur les seules colonnes d'historique
+    def load():
+        return HistoryIndex(be.select([c for c in HISTORY_COLS]))
+
+    return dataset.get_or_load(_indexes, be.version, load)
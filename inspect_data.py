@@ -1,63 +1,96 @@
+import argparse
+import os
+import sys
+import time
+
 import pandas as pd
 
-# chemin vers le fichier déjà nettoyé
-FILE_PATH = "src/espaces_verts_normalized.csv"
-
-df = pd.read_csv(FILE_PATH, sep=";", encoding="utf-8")
-
-print("✅ Fichier chargé")
-print("📏 Shape :", df.shape)
-print("\n--- Aperçu ---")
-print(df.head())
-
-# 1. infos générales
-print("\n=== Info ===")
-print(df.info())
-
-# 2. valeurs manquantes
-print("\n=== Valeurs manquantes par colonne ===")
-print(df.isna().sum().sort_values(ascending=False))
-
-# 3. répartition par catégorie
-print("\n=== Répartition par catégorie ===")
-print(df["categorie"].value_counts())
-
-# 4. top 10 des plus grandes surfaces (si la colonne existe)
-surface_cols = ["surface_totale_reelle_m2", "surface_calculee_m2", "surface_horticole_m2"]
-for col in surface_cols:
-    if col in df.columns:
-        print(f"\n=== Top 10 par {col} ===")
-        print(
-            df[["nom", "categorie", col]]
-            .sort_values(by=col, ascending=False)
-            .head(10)
-        )
-
-# 5. vérif coordonnées
-if {"latitude", "longitude"}.issubset(df.columns):
-    nb_na_lat = df["latitude"].isna().sum()
-    nb_na_lon = df["longitude"].isna().sum()
-    print("\n=== Coordonnées ===")
-    print(f"lignes sans latitude : {nb_na_lat}")
-    print(f"lignes sans longitude : {nb_na_lon}")
-
-# 6. lieux hors Paris (code postal ne commençant pas par 75)
-if "code_postal" in df.columns:
-    df["code_postal_str"] = df["code_postal"].astype(str).str.strip()
-    hors_paris = df[~df["code_postal_str"].str.startswith("75", na=False)].copy()
-
-    print("\n=== Lieux hors Paris (code postal ne commençant pas par 75) ===")
-    print(f"Nombre de lignes hors Paris : {len(hors_paris)}")
-
-    if len(hors_paris):
-        # on récupère aussi les colonnes d'adresse si elles existent
-        adresse_cols = [c for c in df.columns if "adresse" in c.lower()]
-        cols = ["nom", "code_postal", "commune"] if "commune" in df.columns else ["nom", "code_postal"]
-        cols = cols + adresse_cols
-
-        # on évite de planter si certaines colonnes manquent
-        cols = [c for c in cols if c in hors_paris.columns]
-
-        print(hors_paris[cols].sort_values("code_postal").to_string(index=False))
-else:
-    print("\n⚠️ Pas de colonne 'code_postal', impossible de détecter les lieux hors Paris.")
+import data_profile
+import dataset
+
+# Exploration rapide du CSV nettoyé. Lit le profil écrit par load_data.py
+# (src/profile.json, ou celui de la release servie) sans relire le dataset ;
+# --full refait le profil à partir du CSV complet.
+#
+#   python inspect_data.py          # profil précalculé (contrôles de santé)
+#   python inspect_data.py --full   # relecture complète du CSV
+#
+# Code de sortie 1 si le profil est absent ou ne correspond plus au CSV.
+
+
+def print_report(profile):
+    columns = pd.DataFrame.from_dict(profile["columns"], orient="index")
+
+    print("📏 Shape :", (profile["rows"], len(columns)))
+    print("\n--- Aperçu ---")
+    print(pd.DataFrame(profile["head"]).set_index("row_id"))
+
+    # 1. infos générales
+    print("\n=== Info ===")
+    print(columns[["non_null", "dtype", "distinct"]].to_string())
+    print(f"memory usage: {profile['memory_bytes'] / 1e6:.1f} MB")
+
+    # 2. valeurs manquantes
+    print("\n=== Valeurs manquantes par colonne ===")
+    print(columns["nulls"].sort_values(ascending=False, kind="stable").to_string())
+
+    # 3. répartition par catégorie
+    if "categorie" in profile["histograms"]:
+        print("\n=== Répartition par catégorie ===")
+        print(pd.Series(profile["histograms"]["categorie"]["values"]).to_string())
+
+    # 4. min / max des colonnes numériques
+    if "min" in columns.columns:
+        print("\n=== Min / max ===")
+        print(columns.loc[columns["min"].notna(), ["min", "max"]].to_string())
+
+    # 5. top 10 des plus grandes surfaces
+    for col, rows in profile["top"].items():
+        print(f"\n=== Top {len(rows)} par {col} ===")
+        print(pd.DataFrame(rows).set_index("row_id").to_string())
+
+    # 6. vérif coordonnées
+    if {"latitude", "longitude"}.issubset(profile["columns"]):
+        print("\n=== Coordonnées ===")
+        print(f"lignes sans latitude : {profile['columns']['latitude']['nulls']}")
+        print(f"lignes sans longitude : {profile['columns']['longitude']['nulls']}")
+
+    # 7. lieux hors Paris (code postal ne commençant pas par 75)
+    if "code_postal" in profile["columns"]:
+        print("\n=== Lieux hors Paris (code postal ne commençant pas par 75) ===")
+        print(f"Nombre de lignes hors Paris : {len(profile['hors_paris'])}")
+        if profile["hors_paris"]:
+            print(pd.DataFrame(profile["hors_paris"]).to_string(index=False))
+    else:
+        print("\n⚠️ Pas de colonne 'code_postal', impossible de détecter les lieux hors Paris.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exploration rapide du CSV nettoyé")
+    parser.add_argument("--full", action="store_true", help="relire tout le CSV au lieu du profil précalculé")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    base_dir = dataset.artifacts_dir()
+    csv_path = os.path.join(base_dir, dataset.DATA_FILE)
+    if args.full:
+        profile = data_profile.profile_csv(csv_path)
+        print(f"✅ Fichier chargé et profilé : {csv_path}")
+    else:
+        profile_path = os.path.join(base_dir, data_profile.PROFILE_FILE)
+        profile = data_profile.read_profile(profile_path)
+        if profile is None:
+            print(f"❌ Pas de profil ({profile_path}) : relancer python load_data.py, ou --full")
+            return 1
+        if not data_profile.is_fresh(profile, csv_path):
+            print(f"❌ Profil périmé ({profile_path} ne correspond plus à {csv_path}) : relancer python load_data.py, ou --full")
+            return 1
+        print(f"✅ Profil lu : {profile_path}")
+
+    print_report(profile)
+    print(f"\n⏱️ {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,32 @@
+import os
 import sys
 import csv
+import json
+import math
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 
+import artifacts
+import backend
+import data_profile
+import dataset
+import geostore
+import overlaps
+import partitions
+import search
+
 # pour éviter l'erreur "field larger than field limit"
 csv.field_size_limit(sys.maxsize)
 
-INPUT_PATH = "src/espaces_verts.csv"
-OUTPUT_PATH = "src/espaces_verts_normalized.csv"
+DATA_DIR = "src"
+INPUT_PATH = os.path.join(DATA_DIR, "espaces_verts.csv")
 
-# 1. lire le csv brut
-df = pd.read_csv(
-    INPUT_PATH,
-    sep=";",
-    encoding="utf-8",
-    engine="python",
-    on_bad_lines="skip"
-)
-
-# 2. renommer les colonnes -> snake_case
-rename_map = {
+# renommer les colonnes -> snake_case
+RENAME_MAP = {
     "Identifiant espace vert": "id_espace_vert",
     "Nom de l'espace vert": "nom",
     "Typologie d'espace vert": "typologie",
@@ -51,10 +59,9 @@ rename_map = {
     "last_edited_user": "last_edited_user",
     "last_edited_date": "last_edited_date",
 }
-df = df.rename(columns=rename_map)
 
-# 2bis. supprimer les colonnes inutiles
-cols_to_drop = [
+# colonnes inutiles
+COLS_TO_DROP = [
     "id_division",
     "id_atelier_horticole",
     "ida3d_enb",
@@ -65,59 +72,20 @@ cols_to_drop = [
     "last_edited_user",
     "last_edited_date",
 ]
-df = df.drop(columns=cols_to_drop, errors="ignore")
 
-# 2ter. séparer la colonne geo_point en latitude et longitude
-if "geo_point" in df.columns:
-    try:
-        df[["latitude", "longitude"]] = df["geo_point"].str.split(",", expand=True)
-        df["latitude"] = df["latitude"].astype(str).str.strip().astype(float)
-        df["longitude"] = df["longitude"].astype(str).str.strip().astype(float)
-    except Exception as e:
-        print(f"⚠️ Impossible de séparer geo_point : {e}")
-
-# 3. normaliser les champs oui/non
-def normalize_yes_no(val):
-    if pd.isna(val):
-        return pd.NA
-    v = str(val).strip().lower()
-    if v in ("oui", "o", "yes", "y", "true"):
-        return True
-    if v in ("non", "n", "no", "f", "false"):
-        return False
-    return pd.NA
-
-if "presence_cloture" in df.columns:
-    df["presence_cloture"] = df["presence_cloture"].apply(normalize_yes_no)
-
-if "ouverture_24h" in df.columns:
-    df["ouverture_24h"] = df["ouverture_24h"].apply(normalize_yes_no)
-
-# 4. enlever les années "9999" qui sont des placeholders
-year_like_cols = [
+YEAR_LIKE_COLS = [
     "annee_ouverture",
     "annee_renovation",
     "annee_changement_nom",
 ]
-for col in year_like_cols:
-    if col in df.columns:
-        # on met en numérique pour choper les 9999 même s'ils sont en str
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-        df.loc[df[col] == 9999, col] = pd.NA
-
-# 4bis. si jamais surface est 9999 (ça peut arriver), on les vire aussi
-surface_like_cols = [
+
+SURFACE_LIKE_COLS = [
     "surface_totale_reelle_m2",
     "surface_calculee_m2",
     "surface_horticole_m2",
 ]
-for col in surface_like_cols:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-        df.loc[df[col] == 9999, col] = pd.NA
 
-# 5. recaster quelques colonnes numériques
-for col in [
+INT_COLS = [
     "id_espace_vert",
     "adresse_numero",
     "code_postal",
@@ -125,12 +93,10 @@ for col in [
     "annee_renovation",
     "annee_changement_nom",
     "nb_entites",
-]:
-    if col in df.columns:
-        df[col] = df[col].astype("Int64")
+]
 
-# 6. filtrer les catégories pertinentes
-categories_a_garder = [
+# catégories pertinentes
+CATEGORIES_A_GARDER = [
     "Bois",
     "Parc",
     "Square",
@@ -145,26 +111,331 @@ categories_a_garder = [
     "Cimetière",
 ]
 
-nb_total = len(df)
-df = df[df["categorie"].isin(categories_a_garder)]
-nb_filtre = len(df)
 
-print(f"✅ Filtrage appliqué : {nb_filtre} / {nb_total} lignes conservées ({nb_filtre/nb_total:.1%})")
-print("📚 Catégories conservées :", ", ".join(categories_a_garder))
+# validation des géométries : emprise large autour de Paris (lon, lat),
+# le jeu contient aussi des cimetières et bois hors de la ville
+BOUNDS = (2.0, 48.6, 2.8, 49.1)
+MAX_VERTICES = 50_000
+# géométries par lot envoyé à un worker, nombre de workers (défaut : un par cœur)
+GEOMETRY_BATCH_SIZE = 500
+ETL_WORKERS = int(os.environ.get("EV_ETL_WORKERS", "0")) or os.cpu_count() or 1
+
+GEOMETRY_REPORT_FILE = "geometry_report.csv"
+
+# écart relatif toléré entre surface déclarée et surface du polygone
+SURFACE_TOLERANCE = 0.2
+POLYGON_TYPES = ("Polygon", "MultiPolygon")
+
+
+# 1. lire le csv brut
+def read_raw(path=INPUT_PATH):
+    return pd.read_csv(
+        path,
+        sep=";",
+        encoding="utf-8",
+        engine="python",
+        on_bad_lines="skip"
+    )
+
+
+# 3. normaliser les champs oui/non
+def normalize_yes_no(val):
+    if pd.isna(val):
+        return pd.NA
+    v = str(val).strip().lower()
+    if v in ("oui", "o", "yes", "y", "true"):
+        return True
+    if v in ("non", "n", "no", "f", "false"):
+        return False
+    return pd.NA
+
+
+def normalize(df):
+    # 2. renommer les colonnes -> snake_case
+    df = df.rename(columns=RENAME_MAP)
+
+    # 2bis. supprimer les colonnes inutiles
+    df = df.drop(columns=COLS_TO_DROP, errors="ignore")
+
+    # 2ter. séparer la colonne geo_point en latitude et longitude
+    if "geo_point" in df.columns:
+        try:
+            df[["latitude", "longitude"]] = df["geo_point"].str.split(",", expand=True)
+            df["latitude"] = df["latitude"].astype(str).str.strip().astype(float)
+            df["longitude"] = df["longitude"].astype(str).str.strip().astype(float)
+        except Exception as e:
+            print(f"⚠️ Impossible de séparer geo_point : {e}")
+
+    # 3. normaliser les champs oui/non
+    if "presence_cloture" in df.columns:
+        df["presence_cloture"] = df["presence_cloture"].apply(normalize_yes_no)
+
+    if "ouverture_24h" in df.columns:
+        df["ouverture_24h"] = df["ouverture_24h"].apply(normalize_yes_no)
+
+    # 4. enlever les années "9999" qui sont des placeholders
+    for col in YEAR_LIKE_COLS:
+        if col in df.columns:
+            # on met en numérique pour choper les 9999 même s'ils sont en str
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+            df.loc[df[col] == 9999, col] = pd.NA
 
-# 7. corriger les nb_entites incohérents (0, NaN -> 1)
-if "nb_entites" in df.columns:
-    df["nb_entites"] = df["nb_entites"].apply(
-        lambda x: 1 if pd.isna(x) or x <= 0 else x
+    # 4bis. si jamais surface est 9999 (ça peut arriver), on les vire aussi
+    for col in SURFACE_LIKE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+            df.loc[df[col] == 9999, col] = pd.NA
+
+    # 5. recaster quelques colonnes numériques
+    for col in INT_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype("Int64")
+
+    # 6. filtrer les catégories pertinentes
+    nb_total = len(df)
+    df = df[df["categorie"].isin(CATEGORIES_A_GARDER)]
+    nb_filtre = len(df)
+
+    print(f"✅ Filtrage appliqué : {nb_filtre} / {nb_total} lignes conservées ({nb_filtre/nb_total:.1%})")
+    print("📚 Catégories conservées :", ", ".join(CATEGORIES_A_GARDER))
+
+    # 7. corriger les nb_entites incohérents (0, NaN -> 1)
+    if "nb_entites" in df.columns:
+        df["nb_entites"] = df["nb_entites"].apply(
+            lambda x: 1 if pd.isna(x) or x <= 0 else x
+        )
+
+    return df
+
+
+# =========================
+# Géométries : parsing + validation en parallèle
+# =========================
+def check_geometry(raw):
+    # -> (géométrie normalisée ou None, stats de la géométrie)
+    stats = {"type": None, "parties": 0, "anneaux": 0, "sommets": 0, "erreur": None}
+    if pd.isna(raw):
+        stats["erreur"] = "absente"
+        return None, stats
+    try:
+        geom = json.loads(raw)
+        parts = geostore.geometry_parts(geom)
+    except (ValueError, KeyError, TypeError) as e:
+        stats["erreur"] = f"GeoJSON invalide ({type(e).__name__})"
+        return None, stats
+    stats["type"] = geom["type"]
+
+    lon_min, lat_min, lon_max, lat_max = BOUNDS
+    is_polygon = geom["type"] in POLYGON_TYPES
+    normalized = []
+    try:
+        for part in parts:
+            rings = []
+            for ring in part:
+                # 2D uniquement (on jette une éventuelle altitude)
+                ring = [[float(pt[0]), float(pt[1])] for pt in ring]
+                if is_polygon:
+                    # anneau non fermé -> on le ferme
+                    if ring and ring[0] != ring[-1]:
+                        ring.append(ring[0])
+                    if len(ring) < 4:
+                        stats["erreur"] = "anneau de moins de 3 sommets"
+                        return None, stats
+                for lon, lat in ring:
+                    if not (math.isfinite(lon) and math.isfinite(lat)):
+                        stats["erreur"] = "coordonnée non numérique"
+                        return None, stats
+                    if not (lon_min <= lon <= lon_max and lat_min <= lat <= lat_max):
+                        stats["erreur"] = "coordonnées hors zone"
+                        return None, stats
+                rings.append(ring)
+                stats["anneaux"] += 1
+                stats["sommets"] += len(ring)
+            normalized.append(rings)
+    except (ValueError, TypeError, IndexError):
+        stats["erreur"] = "coordonnée non numérique"
+        return None, stats
+
+    stats["parties"] = len(normalized)
+    if stats["sommets"] == 0:
+        stats["erreur"] = "géométrie vide"
+        return None, stats
+    if stats["sommets"] > MAX_VERTICES:
+        stats["erreur"] = f"plus de {MAX_VERTICES} sommets"
+        return None, stats
+    return geostore.rebuild_geometry(geostore.GEOM_TYPES[geom["type"]], normalized), stats
+
+
+def check_batch(values):
+    return [check_geometry(v) for v in values]
+
+
+def check_geometries(values, workers=ETL_WORKERS, batch_size=GEOMETRY_BATCH_SIZE):
+    values = list(values)
+    batches = [values[i:i + batch_size] for i in range(0, len(values), batch_size)]
+    if workers <= 1 or len(batches) <= 1:
+        results = [check_batch(b) for b in batches]
+    else:
+        # les lots reviennent dans l'ordre : résultat aligné sur les lignes
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            results = list(pool.map(check_batch, batches))
+
+    geometries, stats = [], []
+    for batch in results:
+        for geom, st in batch:
+            geometries.append(geom)
+            stats.append(st)
+    return geometries, pd.DataFrame(stats, columns=["type", "parties", "anneaux", "sommets", "erreur"])
+
+
+def geometry_report(df, stats):
+    # une ligne par espace vert : identifiant, nom, stats et erreur éventuelle
+    cols = [c for c in ("id_espace_vert", "nom") if c in df.columns]
+    report = df[cols].reset_index(drop=True).join(stats)
+    report.index.name = "ligne"
+    return report
+
+
+# =========================
+# Métriques des polygones + surface retenue
+# =========================
+def add_polygon_metrics(df, metrics):
+    # metrics : geostore.feature_metrics, surface corrigée des recouvrements internes
+    for col, values in metrics.items():
+        # décimètre / ~1 cm en lon/lat : largement assez, et un CSV plus léger
+        df[col] = values.round(7 if col.startswith(("centre", "bbox")) else 1)
+
+    # surface déclarée : réelle, sinon calculée par la Ville
+    declared = pd.Series(float("nan"), index=df.index)
+    for col in ("surface_calculee_m2", "surface_totale_reelle_m2"):
+        if col in df.columns:
+            declared = pd.to_numeric(df[col], errors="coerce").combine_first(declared)
+
+    geo = df["surface_geo_m2"]
+    ecart = (declared - geo).abs() / pd.concat([declared, geo], axis=1).max(axis=1)
+    df["surface_ecart"] = (ecart > SURFACE_TOLERANCE).fillna(False)
+    # surface retenue : la déclarée si elle colle au polygone, celle du polygone sinon
+    df["surface_m2"] = declared.where(~df["surface_ecart"] & declared.notna(), geo).round(0)
+    return df
+
+
+def build(input_path=INPUT_PATH, out_dir=DATA_DIR):
+    # produit tous les artefacts servis par l'app dans out_dir
+    os.makedirs(out_dir, exist_ok=True)
+    output_path = os.path.join(out_dir, dataset.DATA_FILE)
+    df = normalize(read_raw(input_path))
+
+    # 7bis. parser / valider / normaliser les géométries (sur tous les cœurs)
+    geometries, geo_stats = check_geometries(df["geo_shape"])
+    # geo_shape réécrit normalisé (2D, anneaux fermés) ; invalide -> vide
+    df["geo_shape"] = [
+        json.dumps(g, separators=(",", ":")) if g is not None else pd.NA for g in geometries
+    ]
+    report = geometry_report(df, geo_stats)
+    report.to_csv(os.path.join(out_dir, GEOMETRY_REPORT_FILE), sep=";", encoding="utf-8")
+    invalid = report[report["erreur"].notna()]
+    max_vertices = int(geo_stats["sommets"].max()) if len(geo_stats) else 0
+    print(
+        f"🗺️ Géométries : {len(report) - len(invalid)} valides / {len(report)} "
+        f"({int(geo_stats['sommets'].sum())} sommets, max {max_vertices} par géométrie)"
+    )
+    for err, n in Counter(invalid["erreur"]).most_common():
+        print(f"   ⚠️ {n} × {err}")
+
+    # 7ter. surface, périmètre, centroïde et emprise de chaque polygone (Lambert-93)
+    arrays = geostore.pack_geometries(geometries)
+    metrics = geostore.feature_metrics(arrays)
+
+    # 7quater. graphe des recouvrements (totaux de surface sans double compte) ;
+    # il donne aussi le recouvrement interne des MultiPolygons, retiré de leur surface
+    bounds = pd.DataFrame({c: metrics[c] for c in dataset.BBOX_COLS}).to_numpy(dtype=float)
+    graph = overlaps.build_overlaps(arrays, bounds)
+    metrics["surface_geo_m2"] = metrics["surface_geo_m2"] - graph["self_overlap"]
+    overlaps_dir = os.path.join(out_dir, overlaps.OVERLAPS_SUBDIR)
+    meta = overlaps.write_overlaps(graph, len(df), overlaps_dir)
+    overlap_fmt = f"{meta['overlap_m2']:,.0f}".replace(",", " ")
+    self_fmt = f"{meta['self_overlap_m2']:,.0f}".replace(",", " ")
+    print(
+        f"🧩 Recouvrements : {meta['edges']} paires sur {meta['candidates']} candidates, "
+        f"{overlap_fmt} m² comptés plusieurs fois ; {self_fmt} m² entre parties d'un même MultiPolygon"
+    )
+
+    add_polygon_metrics(df, metrics)
+    print(
+        f"📐 Surface retenue : {int(df['surface_m2'].notna().sum())} lignes, "
+        f"{int(df['surface_ecart'].sum())} écarts > {SURFACE_TOLERANCE:.0%} avec le polygone"
+    )
+
+    # adresse affichée (onglet Données, export, recherche) jointe une fois ici
+    df["adresse"] = dataset.address_text(df)
+
+    # 7quinquies. index de recherche (trigrammes) sur nom, ancien nom et adresse
+    search_dir = os.path.join(out_dir, search.SEARCH_SUBDIR)
+    meta = search.write_index(search.build_index(df), search_dir)
+    print(f"🔎 Index de recherche : {meta['trigrams']} trigrammes, {meta['documents']} textes")
+
+    # 8. compter les cellules vides / NaN par colonne (après nettoyage des 9999)
+    print("\n=== Valeurs manquantes après nettoyage (y compris 9999) ===")
+    na_counts = df.isna().sum().sort_values(ascending=False)
+    print(na_counts)
+
+    # 9. sauvegarder (fichier temporaire puis renommage : jamais de CSV à moitié écrit)
+    tmp_path = output_path + ".tmp"
+    df.to_csv(tmp_path, index=False, sep=";", encoding="utf-8")
+    os.replace(tmp_path, output_path)
+
+    print("✅ Fichier nettoyé écrit dans :", output_path)
+    print("📏 Lignes / colonnes :", df.shape)
+
+    # 9bis. profil du CSV écrit (lu par inspect_data.py sans relire le dataset)
+    profile_path = data_profile.write_profile(
+        data_profile.profile_csv(output_path), os.path.join(out_dir, data_profile.PROFILE_FILE)
     )
+    print("✅ Profil écrit dans :", profile_path)
+
+    # 10. base embarquée (SQLite) pour le backend de requêtes
+    db_path = os.path.join(out_dir, backend.DB_FILE)
+    backend.write_database(output_path, db_path)
+    print("✅ Base SQLite écrite dans :", db_path)
+
+    # 11. partitions par code postal + index
+    parts_dir = os.path.join(out_dir, partitions.PARTITIONS_SUBDIR)
+    index = partitions.write_partitions(output_path, parts_dir)
+    print(f"✅ {len(index['partitions'])} partitions écrites dans :", parts_dir)
+
+    # 12. store de géométries plat (mémoire mappée), aligné sur les lignes du CSV
+    geometry_dir = os.path.join(out_dir, geostore.GEOMETRY_SUBDIR)
+    meta = geostore.write_store(arrays, geometry_dir, source=artifacts.content_hash(output_path))
+    print(f"✅ Store de géométries écrit dans : {geometry_dir} ({meta['vertices']} sommets)")
+
+    return {"rows": int(len(df)), "columns": int(df.shape[1])}
+
+
+def main():
+    # build dans un dossier temporaire, validé puis publié en release comme
+    # refresh_worker.py : l'app (versions.py) ne voit jamais un mélange
+    # d'artefacts de deux builds, et chaque version reste relisible tant
+    # que sa release est gardée sur disque
+    # import local : refresh_worker importe ce module
+    import refresh_worker
+
+    os.makedirs(dataset.RELEASES_DIR, exist_ok=True)
+    build_dir = os.path.join(dataset.RELEASES_DIR, f".build-{int(time.time() * 1000)}")
+    try:
+        build(INPUT_PATH, build_dir)
+        errors = refresh_worker.validate_build(build_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    if errors:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        print("❌ Build rejeté : " + " ; ".join(errors))
+        return 1
 
-# 8. compter les cellules vides / NaN par colonne (après nettoyage des 9999)
-print("\n=== Valeurs manquantes après nettoyage (y compris 9999) ===")
-na_counts = df.isna().sum().sort_values(ascending=False)
-print(na_counts)
+    release = refresh_worker.publish(build_dir)
+    print(f"✅ Release {release} publiée ({dataset.CURRENT_FILE})")
+    return 0
 
-# 9. sauvegarder
-df.to_csv(OUTPUT_PATH, index=False, sep=";", encoding="utf-8")
 
-print("✅ Fichier nettoyé écrit dans :", OUTPUT_PATH)
-print("📏 Lignes / colonnes :", df.shape)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import json
+import os
+
+import numpy as np
+
+import artifacts
+import dataset
+import green_cover
+
+# Graphe des recouvrements entre espaces verts (un square dans un bois, une
+# promenade qui traverse un parc...), précalculé par load_data.py :
+# 1. jointure spatiale sur les emprises (index trié par lon_min, balayage)
+#    -> paires candidates ;
+# 2. superposition fine des polygones candidats (balayage de lignes à ~2 m)
+#    -> "atomes" = zones couvertes par au moins deux espaces, avec leur surface.
+#    Chaque espace y est dissous : les parties d'un MultiPolygon qui se
+#    recouvrent ne comptent qu'une fois, et leur recouvrement est retiré de
+#    surface_geo_m2 par load_data.py.
+# Surface sans double compte d'une sélection S = somme des surfaces
+#   - somme sur les atomes de surface(atome) x (nb d'espaces de S qui le couvrent - 1),
+# soit quelques opérations NumPy par requête, quel que soit le filtre.
+OVERLAPS_SUBDIR = "overlaps"
+OVERLAPS_DIR = os.path.join(dataset.DATA_DIR, OVERLAPS_SUBDIR)
+META_FILE = "meta.json"
+
+OVERLAP_CELL_M = 2
+
+
+# =========================
+# Construction (appelée par load_data.py)
+# =========================
+def candidate_pairs(bounds):
+    # bounds : (n, 4) lon_min, lat_min, lon_max, lat_max (NaN sans géométrie)
+    valid = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+    b = bounds[valid]
+    order = np.argsort(b[:, 0], kind="stable")
+    lon_min_sorted = b[order, 0]
+
+    # pour chaque emprise, celles qui commencent avant sa fin (et après elle dans l'ordre trié)
+    stop = np.searchsorted(lon_min_sorted, b[order, 2], side="right")
+    counts = np.maximum(stop - np.arange(len(order)) - 1, 0)
+    i = np.repeat(np.arange(len(order)), counts)
+    j = i + 1 + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    i, j = order[i], order[j]
+
+    overlap = (b[i, 1] <= b[j, 3]) & (b[j, 1] <= b[i, 3])
+    i, j = valid[i[overlap]], valid[j[overlap]]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def overlay_atoms(arrays, features, cell_m=OVERLAP_CELL_M):
+    # zones couvertes par au moins deux des features données -> {frozenset(ids): m²},
+    # chaque feature étant dissoute (union de ses parties) ; plus, par feature,
+    # la surface comptée en trop par ses parties qui se recouvrent -> {id: m²}
+    if len(features) == 0:
+        return {}, {}
+    grid = green_cover.make_grid(np.asarray(arrays["coords"]), cell_m=cell_m, display_cell_m=cell_m)
+    feat, rows, start, end = green_cover.polygon_spans(arrays, grid)
+    keep = np.isin(feat, features)
+    feat, rows, start, end = feat[keep], rows[keep], start[keep], end[keep]
+    areas = green_cover.pixel_areas(grid)
+
+    # seules les lignes de pixels traversées par au moins deux segments comptent
+    uniq_rows, row_counts = np.unique(rows, return_counts=True)
+    busy = np.isin(rows, uniq_rows[row_counts > 1])
+    feat, rows, start, end = feat[busy], rows[busy], start[busy], end[busy]
+
+    atoms = {}
+    self_overlap = {}
+    order = np.lexsort((start, rows))
+    feat, rows, start, end = feat[order], rows[order], start[order], end[order]
+    bounds = np.flatnonzero(np.diff(rows)) + 1
+    for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(rows)]):
+        # balayage des débuts / fins de segments de la ligne
+        events = sorted(
+            [(int(start[k]), 1, int(feat[k])) for k in range(lo, hi)]
+            + [(int(end[k]), -1, int(feat[k])) for k in range(lo, hi)]
+        )
+        active = {}
+        prev_x = None
+        for x, delta, f in events:
+            if prev_x is not None and x > prev_x:
+                area = (x - prev_x) * areas[rows[lo]]
+                covering = [g for g, n in active.items() if n > 0]
+                if len(covering) > 1:
+                    key = frozenset(covering)
+                    atoms[key] = atoms.get(key, 0.0) + area
+                # n parties d'une même feature : n - 1 fois de trop dans sa surface
+                for g, n in active.items():
+                    if n > 1:
+                        self_overlap[g] = self_overlap.get(g, 0.0) + (n - 1) * area
+            active[f] = active.get(f, 0) + delta
+            prev_x = x
+    return atoms, self_overlap
+
+
+def multipart_features(arrays):
+    # features à plusieurs parties dont au moins deux emprises de parties se touchent
+    feature_offsets = np.asarray(arrays["feature_offsets"])
+    part_offsets = np.asarray(arrays["part_offsets"])
+    ring_offsets = np.asarray(arrays["ring_offsets"])
+    coords = np.asarray(arrays["coords"])
+    result = []
+    for f in np.flatnonzero(np.diff(feature_offsets) > 1):
+        bounds = []
+        for p in range(feature_offsets[f], feature_offsets[f + 1]):
+            pts = coords[ring_offsets[part_offsets[p]]:ring_offsets[part_offsets[p] + 1]]
+            if len(pts):
+                bounds.append(np.r_[pts.min(axis=0), pts.max(axis=0)])
+        if len(bounds) > 1 and len(candidate_pairs(np.asarray(bounds))[0]):
+            result.append(f)
+    return np.asarray(result, dtype=np.int64)
+
+
+def build_overlaps(arrays, bounds):
+    i, j = candidate_pairs(bounds)
+    # features voisines + MultiPolygons dont les parties peuvent se recouvrir
+    features = np.unique(np.concatenate([i, j, multipart_features(arrays)]))
+    atoms, self_overlap = overlay_atoms(arrays, features)
+
+    # arêtes du graphe : surface d'intersection de chaque paire qui se recouvre
+    edges = {}
+    for members, area in atoms.items():
+        members = sorted(members)
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                key = (members[a], members[b])
+                edges[key] = edges.get(key, 0.0) + area
+
+    atom_list = sorted(atoms.items(), key=lambda kv: sorted(kv[0]))
+    members = [sorted(m) for m, _ in atom_list]
+    edge_list = sorted(edges.items())
+    return {
+        "edges": np.asarray([e for e, _ in edge_list], dtype=np.int64).reshape(-1, 2),
+        "edge_areas": np.asarray([a for _, a in edge_list], dtype=np.float64),
+        "atom_offsets": np.cumsum([0] + [len(m) for m in members]).astype(np.int64),
+        "atom_members": np.asarray([f for m in members for f in m], dtype=np.int64),
+        "atom_areas": np.asarray([a for _, a in atom_list], dtype=np.float64),
+        "candidates": int(len(i)),
+        # par ligne : surface en trop dans la somme des parties (à retirer de surface_geo_m2)
+        "self_overlap": np.bincount(
+            np.asarray(list(self_overlap), dtype=np.int64),
+            np.asarray(list(self_overlap.values()), dtype=np.float64),
+            minlength=len(bounds),
+        ),
+    }
+
+
+def write_overlaps(graph, n_features, out_dir=OVERLAPS_DIR):
+    tmp_dir = artifacts.new_tmp_dir(out_dir)
+    # seuls les atomes servent aux requêtes ; les paires ne sont gardées que dans meta.json (comptes)
+    for name in ("atom_offsets", "atom_members", "atom_areas"):
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), graph[name])
+    meta = {
+        "features": int(n_features),
+        "candidates": graph["candidates"],
+        "edges": int(len(graph["edges"])),
+        "atoms": int(len(graph["atom_areas"])),
+        "overlap_m2": float(graph["edge_areas"].sum()),
+        "self_overlap_m2": float(graph["self_overlap"].sum()),
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    artifacts.publish_dir(tmp_dir, out_dir)
+    return meta
+
+
+# =========================
+# Lecture + surface sans double compte
+# =========================
+class OverlapGraph:
+    def __init__(self, graph_dir=OVERLAPS_DIR):
+        with open(os.path.join(graph_dir, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(graph_dir, f"{name}.npy"))
+
+        self.atom_offsets = load("atom_offsets")
+        self.atom_members = load("atom_members")
+        self.atom_areas = load("atom_areas")
+
+    def __len__(self):
+        return self.meta["features"]
+
+    def double_counted(self, ids):
+        # surface comptée plusieurs fois quand on somme les surfaces des lignes ids
+        if len(self.atom_areas) == 0:
+            return 0.0
+        selected = np.zeros(len(self), dtype=bool)
+        selected[np.asarray(ids, dtype=np.int64)] = True
+        k = np.add.reduceat(selected[self.atom_members].astype(np.int64), self.atom_offsets[:-1])
+        return float((self.atom_areas * np.maximum(k - 1, 0)).sum())
+
+
+def get_graph(graph_dir=OVERLAPS_DIR, expected_features=None):
+    # None si le graphe n'a pas été construit (ou ne correspond pas au dataset) :
+    # les totaux restent alors de simples sommes
+    graph = artifacts.cached_by_stat(os.path.join(graph_dir, META_FILE), lambda: OverlapGraph(graph_dir))
+    if graph is None or (expected_features is not None and len(graph) != expected_features):
+        return None
+    return graph
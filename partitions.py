@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+import artifacts
+import dataset
+import geostore
+
+# une partition par code postal + un petit index (effectifs, emprise, années)
+PARTITIONS_SUBDIR = "partitions"
+PARTITIONS_DIR = os.path.join(dataset.DATA_DIR, PARTITIONS_SUBDIR)
+INDEX_FILE = "index.json"
+UNKNOWN_CP = "inconnu"
+
+
+def partition_file(code_postal):
+    return f"cp_{code_postal}.csv"
+
+
+def _bounds(part):
+    lon_min, lat_min, lon_max, lat_max = dataset.feature_bounds(part)
+    if lon_min.isna().all():
+        return None
+    return [float(lon_min.min()), float(lat_min.min()), float(lon_max.max()), float(lat_max.max())]
+
+
+def _year_range(part):
+    if "annee_ouverture" not in part.columns:
+        return None
+    years = pd.to_numeric(part["annee_ouverture"], errors="coerce").dropna()
+    if years.empty:
+        return None
+    return [int(years.min()), int(years.max())]
+
+
+# =========================
+# Écriture (appelée par load_data.py)
+# =========================
+def write_partitions(csv_path=dataset.DATA_PATH, out_dir=PARTITIONS_DIR):
+    df = dataset.add_arrondissement_columns(dataset.read_dataset(csv_path))
+    # ordre d'origine conservé pour pouvoir reconcaténer les partitions
+    df.insert(0, "row_id", range(len(df)))
+    cp_key = df["code_postal"].fillna(UNKNOWN_CP)
+
+    # on écrit dans un dossier à côté puis on remplace le dossier entier
+    tmp_dir = artifacts.new_tmp_dir(out_dir)
+
+    partitions = []
+    for cp, part in df.groupby(cp_key, sort=True):
+        name = partition_file(cp)
+        part.drop(columns=["arrondissement", "arrondissement_affiche"]).to_csv(
+            os.path.join(tmp_dir, name), index=False, sep=";", encoding="utf-8"
+        )
+        partitions.append({
+            "code_postal": cp,
+            # tous les libellés du code postal (le repli sur la commune peut
+            # en donner plusieurs), pas seulement celui de la première ligne
+            "arrondissements": sorted(part["arrondissement_affiche"].dropna().unique()),
+            "file": name,
+            "count": int(len(part)),
+            "bounds": _bounds(part),
+            "years": _year_range(part),
+        })
+
+    index = {
+        "count": int(len(df)),
+        "categories": sorted(df["categorie"].dropna().unique()),
+        "arrondissements": dataset.arrondissement_options(df),
+        "partitions": partitions,
+    }
+    with open(os.path.join(tmp_dir, INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+    artifacts.publish_dir(tmp_dir, out_dir)
+    return index
+
+
+# =========================
+# Lecture sélective
+# =========================
+def read_index(parts_dir=PARTITIONS_DIR):
+    with open(os.path.join(parts_dir, INDEX_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _intersects(a, b):
+    return not (a[2] < b[0] or a[0] > b[2] or a[3] < b[1] or a[1] > b[3])
+
+
+def select_partitions(index, arrondissements=None, bbox=None, year_max=None):
+    # bbox = [lon_min, lat_min, lon_max, lat_max] (vue de la carte)
+    selected = []
+    for p in index["partitions"]:
+        # index écrit avant la liste des libellés : celui de la première ligne
+        labels = p.get("arrondissements") or [p["arrondissement_affiche"]]
+        if arrondissements and not set(labels) & set(arrondissements):
+            continue
+        if bbox is not None and (p["bounds"] is None or not _intersects(p["bounds"], bbox)):
+            continue
+        if year_max is not None and (p["years"] is None or p["years"][0] > year_max):
+            continue
+        selected.append(p)
+    return selected
+
+
+class PartitionStore:
+    # cache des partitions déjà lues (préparées comme dataset.load_dataset)
+    def __init__(self, parts_dir=PARTITIONS_DIR):
+        self.parts_dir = parts_dir
+        self.index = read_index(parts_dir)
+        store_dir = os.path.join(os.path.dirname(parts_dir), geostore.GEOMETRY_SUBDIR)
+        self.geometry_store = geostore.get_store(
+            store_dir,
+            expected_features=self.index["count"],
+            csv_path=os.path.join(os.path.dirname(parts_dir), dataset.DATA_FILE),
+        )
+        self._lock = threading.Lock()
+        self._frames = {}
+
+    def _load(self, p):
+        with self._lock:
+            if p["file"] not in self._frames:
+                part = dataset.read_dataset(os.path.join(self.parts_dir, p["file"]))
+                dataset.add_arrondissement_columns(part)
+                dataset.add_geometry_flags(part, self.geometry_store, part["row_id"])
+                self._frames[p["file"]] = part
+            return self._frames[p["file"]]
+
+    def load(self, arrondissements=None, bbox=None, year_max=None):
+        selected = select_partitions(self.index, arrondissements, bbox, year_max)
+        if selected:
+            frames = [self._load(p) for p in selected]
+        else:
+            # aucune partition concernée : frame vide mais avec les bonnes colonnes
+            frames = [self._load(self.index["partitions"][0]).iloc[:0]]
+        df = pd.concat(frames) if len(frames) > 1 else frames[0]
+        return df.sort_values("row_id").set_index("row_id", drop=True)
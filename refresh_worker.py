@@ -0,0 +1,272 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import dataset
+import load_data
+
+# Service de rafraîchissement : surveille src/incoming/ (exports bruts *.csv),
+# lance la normalisation dans un process à part, valide le résultat puis le
+# publie en release (src/releases/<version>/) par renommage atomique.
+# L'app bascule dessus toute seule (versions.py), l'ancienne release est
+# gardée pour un retour arrière.
+INCOMING_DIR = os.path.join(dataset.DATA_DIR, "incoming")
+DONE_DIR = os.path.join(INCOMING_DIR, "done")
+FAILED_DIR = os.path.join(INCOMING_DIR, "failed")
+HISTORY_FILE = os.path.join(dataset.RELEASES_DIR, "history.json")
+
+POLL_INTERVAL_S = float(os.environ.get("EV_REFRESH_INTERVAL", "10"))
+# releases conservées sur disque (la courante comprise)
+KEEP_RELEASES = 3
+
+REQUIRED_COLUMNS = ["nom", "categorie", "code_postal", "geo_shape"]
+
+
+# =========================
+# Validation d'un build
+# =========================
+def validate_build(build_dir):
+    import sqlite3
+
+    import backend
+    import data_profile
+    import geostore
+    import partitions
+
+    errors = []
+    try:
+        df = dataset.read_dataset(os.path.join(build_dir, dataset.DATA_FILE))
+    except Exception as e:
+        return [f"CSV illisible : {e}"]
+
+    if df.empty:
+        errors.append("aucune ligne")
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        errors.append(f"colonnes manquantes : {', '.join(missing)}")
+    if "categorie" in df.columns:
+        unknown = set(df["categorie"].dropna()) - set(load_data.CATEGORIES_A_GARDER)
+        if unknown:
+            errors.append(f"catégories inattendues : {', '.join(sorted(unknown))}")
+
+    try:
+        con = sqlite3.connect(os.path.join(build_dir, backend.DB_FILE))
+        nb_db = con.execute(f"SELECT COUNT(*) FROM {backend.TABLE}").fetchone()[0]
+        con.close()
+        if nb_db != len(df):
+            errors.append(f"base SQLite : {nb_db} lignes au lieu de {len(df)}")
+    except Exception as e:
+        errors.append(f"base SQLite illisible : {e}")
+
+    try:
+        index = partitions.read_index(os.path.join(build_dir, partitions.PARTITIONS_SUBDIR))
+        if index["count"] != len(df):
+            errors.append(f"partitions : {index['count']} lignes au lieu de {len(df)}")
+    except Exception as e:
+        errors.append(f"index des partitions illisible : {e}")
+
+    try:
+        store = geostore.GeometryStore(os.path.join(build_dir, geostore.GEOMETRY_SUBDIR))
+        if len(store) != len(df):
+            errors.append(f"store de géométries : {len(store)} features au lieu de {len(df)}")
+    except Exception as e:
+        errors.append(f"store de géométries illisible : {e}")
+
+    profile = data_profile.read_profile(os.path.join(build_dir, data_profile.PROFILE_FILE))
+    if profile is None or not data_profile.is_fresh(profile, os.path.join(build_dir, dataset.DATA_FILE)):
+        errors.append("profil absent ou périmé")
+
+    return errors
+
+
+# =========================
+# Publication / retour arrière
+# =========================
+def read_history():
+    try:
+        with open(HISTORY_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def set_current(release):
+    # le pointeur src/current est remplacé d'un coup : un lecteur voit
+    # l'ancienne release ou la nouvelle, jamais un état intermédiaire
+    _write_atomic(dataset.CURRENT_FILE, release + "\n")
+
+
+def publish(build_dir):
+    import artifacts
+
+    release = artifacts.content_hash(os.path.join(build_dir, dataset.DATA_FILE))[:12]
+    release_dir = os.path.join(dataset.RELEASES_DIR, release)
+    if os.path.exists(release_dir):
+        # même contenu déjà publié : on repointe simplement dessus
+        shutil.rmtree(build_dir)
+    else:
+        os.replace(build_dir, release_dir)
+
+    history = [r for r in read_history() if r != release] + [release]
+    set_current(release)
+    prune(history)
+    return release
+
+
+def rollback():
+    # -> release restaurée ; RuntimeError si aucune release précédente n'est encore sur disque
+    history = [r for r in read_history() if os.path.isdir(os.path.join(dataset.RELEASES_DIR, r))]
+    if len(history) < 2:
+        raise RuntimeError("aucune release précédente à restaurer")
+    target = history[-2]
+    if not os.path.isdir(os.path.join(dataset.RELEASES_DIR, target)):
+        raise RuntimeError(f"release {target} introuvable dans {dataset.RELEASES_DIR}")
+    set_current(target)
+    _write_atomic(HISTORY_FILE, json.dumps(history[:-1]))
+    return target
+
+
+def prune(history, keep=KEEP_RELEASES):
+    # garde les keep dernières releases sur disque ; l'historique ne liste
+    # plus que celles-là (un retour arrière ne vise jamais une release supprimée)
+    kept = history[-keep:]
+    for name in os.listdir(dataset.RELEASES_DIR):
+        path = os.path.join(dataset.RELEASES_DIR, name)
+        if os.path.isdir(path) and not name.startswith(".") and name not in kept:
+            shutil.rmtree(path, ignore_errors=True)
+    kept = [r for r in kept if os.path.isdir(os.path.join(dataset.RELEASES_DIR, r))]
+    _write_atomic(HISTORY_FILE, json.dumps(kept))
+    return kept
+
+
+# =========================
+# Surveillance du dossier de dépôt
+# =========================
+def build_release(raw_path, build_dir):
+    # exécuté dans le process pool : hors du process qui sert l'app
+    shutil.rmtree(build_dir, ignore_errors=True)
+    summary = load_data.build(raw_path, build_dir)
+    return summary, validate_build(build_dir)
+
+
+class RefreshWorker:
+    def __init__(self, incoming_dir=INCOMING_DIR, interval=POLL_INTERVAL_S):
+        self.incoming_dir = incoming_dir
+        self.interval = interval
+        # spawn : le worker tourne dans le serveur Streamlit multithreadé, un fork
+        # copierait des verrous tenus par d'autres threads
+        self.pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        # fichier -> (taille, date) au dernier passage : on attend qu'un
+        # dépôt soit stable sur deux passages avant de le traiter
+        self._seen = {}
+
+    def pending(self):
+        ready = []
+        current = {}
+        for name in sorted(os.listdir(self.incoming_dir)):
+            path = os.path.join(self.incoming_dir, name)
+            if not name.endswith(".csv") or not os.path.isfile(path):
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # déplacé entre listdir et stat
+                continue
+            current[path] = (st.st_size, st.st_mtime_ns)
+            if self._seen.get(path) == current[path]:
+                ready.append(path)
+        self._seen = current
+        return ready
+
+    def process(self, raw_path):
+        name = os.path.basename(raw_path)
+        build_dir = os.path.join(dataset.RELEASES_DIR, f".build-{int(time.time() * 1000)}")
+        print(f"🛠️ Normalisation de {name}...")
+        try:
+            summary, errors = self.pool.submit(build_release, raw_path, build_dir).result()
+        except Exception as e:
+            summary, errors = None, [f"échec du build : {e}"]
+
+        if errors:
+            print(f"❌ {name} rejeté : " + " ; ".join(errors))
+            shutil.rmtree(build_dir, ignore_errors=True)
+            os.replace(raw_path, os.path.join(FAILED_DIR, name))
+            return None
+
+        release = publish(build_dir)
+        os.replace(raw_path, os.path.join(DONE_DIR, name))
+        print(f"✅ {name} publié : release {release} ({summary['rows']} lignes)")
+        return release
+
+    def poll(self):
+        for d in (self.incoming_dir, DONE_DIR, FAILED_DIR, dataset.RELEASES_DIR):
+            os.makedirs(d, exist_ok=True)
+        results = []
+        for path in self.pending():
+            # un dépôt en erreur ne bloque pas les suivants
+            try:
+                results.append(self.process(path))
+            except Exception as e:
+                print(f"❌ Traitement de {os.path.basename(path)} impossible : {e}")
+                results.append(None)
+        return results
+
+    def run(self):
+        while True:
+            # une erreur (disque, renommage...) ne doit pas arrêter le thread :
+            # on la signale et on réessaie au passage suivant
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Rafraîchissement des données en erreur : {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="refresh-worker", daemon=True)
+        thread.start()
+        return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rafraîchissement des données en arrière-plan")
+    parser.add_argument("--once", action="store_true",
+                        help="traiter les dépôts présents puis quitter")
+    parser.add_argument("--rollback", action="store_true",
+                        help="revenir à la release précédente")
+    args = parser.parse_args(argv)
+
+    if args.rollback:
+        try:
+            print(f"↩️ Release courante : {rollback()}")
+        except RuntimeError as e:
+            print(f"❌ Retour arrière impossible : {e}")
+            return 1
+        return 0
+
+    worker = RefreshWorker()
+    if args.once:
+        # deux passages : un dépôt doit être vu stable avant d'être traité
+        worker.poll()
+        results = worker.poll()
+        return 1 if None in results else 0
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
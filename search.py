@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import artifacts
+import dataset
+
+# Recherche approximative par trigrammes sur le nom, l'ancien nom et l'adresse.
+# L'index (trigramme -> documents) est construit une fois par load_data.py ;
+# une requête ne fait que compter les trigrammes communs (np.unique sur les
+# listes de documents des trigrammes de la requête), sans parcourir les textes.
+SEARCH_SUBDIR = "search"
+SEARCH_DIR = os.path.join(dataset.DATA_DIR, SEARCH_SUBDIR)
+META_FILE = "meta.json"
+
+# champ indexé -> poids dans le score
+FIELDS = {"nom": 1.0, "ancien_nom": 0.9, "adresse": 0.8}
+
+MIN_SCORE = 0.3
+MAX_RESULTS = 10
+
+
+def normalize_text(text):
+    # minuscules, sans accents ni ponctuation : "Forêt" -> "foret", "Cimetière" -> "cimetiere"
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def trigrams(text):
+    # trigrammes de chaque mot, entouré d'espaces (comme pg_trgm) : "bois" -> "  b", " bo", ...
+    grams = set()
+    for word in normalize_text(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# =========================
+# Construction (appelée par load_data.py)
+# =========================
+def build_index(df):
+    texts = {"nom": df["nom"], "ancien_nom": df.get("ancien_nom"), "adresse": df["adresse"]}
+
+    vocab = {}
+    postings = []
+    doc_rows, doc_fields, doc_sizes = [], [], []
+    for field_id, field in enumerate(FIELDS):
+        values = texts[field]
+        if values is None:
+            continue
+        for row, value in enumerate(values.tolist()):
+            if pd.isna(value):
+                continue
+            grams = trigrams(value)
+            if not grams:
+                continue
+            doc = len(doc_rows)
+            doc_rows.append(row)
+            doc_fields.append(field_id)
+            doc_sizes.append(len(grams))
+            for g in grams:
+                if g not in vocab:
+                    vocab[g] = len(postings)
+                    postings.append([])
+                postings[vocab[g]].append(doc)
+
+    # pour afficher un résultat et centrer la carte sans repasser par le backend
+    labels = dataset.add_arrondissement_columns(
+        df[[c for c in ("code_postal", "commune") if c in df.columns]].copy()
+    )["arrondissement_affiche"]
+    lon = df["centre_lon"].fillna(df["longitude"]) if "centre_lon" in df.columns else df.get("longitude")
+    lat = df["centre_lat"].fillna(df["latitude"]) if "centre_lat" in df.columns else df.get("latitude")
+    rows = pd.DataFrame({
+        "nom": df["nom"].astype("string").fillna("").to_numpy(),
+        "arrondissement_affiche": labels.to_numpy(),
+        "longitude": lon.to_numpy() if lon is not None else np.nan,
+        "latitude": lat.to_numpy() if lat is not None else np.nan,
+    })
+
+    return {
+        "vocab": vocab,
+        "offsets": np.cumsum([0] + [len(p) for p in postings]).astype(np.int64),
+        "docs": np.asarray([d for p in postings for d in p], dtype=np.int64),
+        "doc_rows": np.asarray(doc_rows, dtype=np.int64),
+        "doc_fields": np.asarray(doc_fields, dtype=np.int8),
+        "doc_sizes": np.asarray(doc_sizes, dtype=np.int32),
+        "rows": rows,
+    }
+
+
+def write_index(index, out_dir=SEARCH_DIR):
+    tmp_dir = artifacts.new_tmp_dir(out_dir)
+    for name in ("offsets", "docs", "doc_rows", "doc_fields", "doc_sizes"):
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), index[name])
+    index["rows"].to_csv(os.path.join(tmp_dir, "rows.csv"), sep=";", index=False)
+    meta = {
+        "vocab": index["vocab"],
+        "rows": int(len(index["rows"])),
+        "documents": int(len(index["doc_rows"])),
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    artifacts.publish_dir(tmp_dir, out_dir)
+    return {k: v for k, v in meta.items() if k != "vocab"} | {"trigrams": len(index["vocab"])}
+
+
+# =========================
+# Lecture + requêtes
+# =========================
+class SearchIndex:
+    def __init__(self, index_dir=SEARCH_DIR):
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vocab = meta.pop("vocab")
+        self.meta = meta
+
+        def load(name):
+            return np.load(os.path.join(index_dir, f"{name}.npy"))
+
+        self.offsets = load("offsets")
+        self.docs = load("docs")
+        self.doc_rows = load("doc_rows")
+        self.doc_fields = load("doc_fields")
+        self.doc_sizes = load("doc_sizes")
+        self.weights = np.asarray(list(FIELDS.values()))
+        self.rows = pd.read_csv(
+            os.path.join(index_dir, "rows.csv"), sep=";", keep_default_na=False, na_values=[""]
+        )
+
+    def search(self, query, limit=MAX_RESULTS, min_score=MIN_SCORE):
+        # -> DataFrame (row_id, nom, arrondissement_affiche, longitude, latitude, champ, score)
+        grams = trigrams(query)
+        ids = [self.vocab[g] for g in grams if g in self.vocab]
+        if not grams or not ids:
+            return self.rows.iloc[0:0].assign(row_id=[], champ=[], score=[])
+
+        # trigrammes communs par document ; score = moyenne de la similarité de
+        # Jaccard (textes proches) et de la part de la requête retrouvée (requête
+        # courte dans un nom long), pondérée par champ
+        hits = np.concatenate([self.docs[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        docs, common = np.unique(hits, return_counts=True)
+        jaccard = common / (len(grams) + self.doc_sizes[docs] - common)
+        coverage = common / len(grams)
+        score = (jaccard + coverage) / 2 * self.weights[self.doc_fields[docs]]
+
+        # meilleur champ par espace vert
+        order = np.lexsort((-score, self.doc_rows[docs]))
+        docs, score = docs[order], score[order]
+        first = np.r_[True, np.diff(self.doc_rows[docs]) != 0]
+        docs, score = docs[first], score[first]
+
+        keep = score >= min_score
+        docs, score = docs[keep], score[keep]
+        top = np.argsort(-score, kind="stable")[:limit]
+        docs, score = docs[top], score[top]
+
+        rows = self.doc_rows[docs]
+        result = self.rows.iloc[rows].reset_index(drop=True)
+        result.insert(0, "row_id", rows)
+        result["champ"] = [list(FIELDS)[f] for f in self.doc_fields[docs]]
+        result["score"] = score.round(3)
+        return result
+
+
+def get_index(index_dir=SEARCH_DIR):
+    # None si l'index n'a pas été construit (python load_data.py)
+    return artifacts.cached_by_stat(os.path.join(index_dir, META_FILE), lambda: SearchIndex(index_dir))
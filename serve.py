@@ -0,0 +1,50 @@
+import os
+import sys
+
+import warmup
+
+# Lance Streamlit dans le même process après avoir préchauffé le dataset :
+# app.py retrouve le cache de dataset.py déjà rempli, la première session
+# ne paie plus les imports ni la lecture du CSV.
+#
+#   python serve.py [options streamlit...]
+#
+# EV_REFRESH_WORKER=1 : lance aussi refresh_worker.py en tâche de fond
+# (les builds tournent dans un process séparé, l'app n'est pas ralentie).
+# EV_API=1 : sert aussi l'API HTTP (api.py, port $EV_API_PORT) sur le même
+# dataset préchauffé.
+# Budget de démarrage ($EV_STARTUP_BUDGET, cf. warmup.py) dépassé : refus de
+# démarrer (code 1), sauf EV_STARTUP_STRICT=0 qui ne fait qu'avertir.
+STRICT_BUDGET = os.environ.get("EV_STARTUP_STRICT", "1") == "1"
+
+
+def main():
+    timings = warmup.prewarm()
+    warmup.print_report(timings)
+    errors = warmup.check_budget(timings)
+    for err in errors:
+        print(f"{'❌' if STRICT_BUDGET else '⚠️'} Budget de démarrage : {err}")
+    if errors and STRICT_BUDGET:
+        print("Démarrage annulé (EV_STARTUP_STRICT=0 pour démarrer quand même)")
+        return 1
+
+    if os.environ.get("EV_REFRESH_WORKER") == "1":
+        import refresh_worker
+
+        refresh_worker.RefreshWorker().start()
+        print(f"👀 Surveillance de {refresh_worker.INCOMING_DIR} pour les nouveaux exports")
+
+    if os.environ.get("EV_API") == "1":
+        import api
+
+        server = api.start()
+        print(f"🌐 API sur http://{server.server_address[0]}:{server.server_address[1]}")
+
+    from streamlit.web import cli as stcli
+
+    sys.argv = ["streamlit", "run", "app.py", *sys.argv[1:]]
+    return stcli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
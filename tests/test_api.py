@@ -0,0 +1,96 @@
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+import api
+import backend
+
+
+class ZeroSurfaceBackend:
+    # backend factice : une sélection dont la surface est réellement nulle
+    version = "v1"
+    nb_rows = 1
+    # liste longue : la réponse de /version dépasse le seuil de compression
+    categories = [f"Catégorie {i}" for i in range(200)]
+    arrondissements = ["1er"]
+    year_min = year_max = 1900
+
+    def select(self, columns, **filters):
+        return pd.DataFrame({"categorie": ["Square"], "arrondissement_affiche": ["1er"], backend.SURFACE_COL: [0.0]})
+
+    def total_surface(self, **filters):
+        return 0.0
+
+
+@pytest.mark.parametrize("lon", ["nan", "inf", "-inf"])
+def test_nearest_rejects_non_finite_coordinates(lon):
+    with pytest.raises(api.ApiError) as e:
+        api.get_nearest(None, {"lon": [lon], "lat": ["48.85"]})
+    assert e.value.status == 400
+
+
+def test_bbox_rejects_non_finite_values():
+    with pytest.raises(api.ApiError):
+        api.parse_filters({"bbox": ["2.2,nan,2.4,48.9"]})
+
+
+def test_stats_keeps_zero_surface():
+    stats = api.get_stats(ZeroSurfaceBackend(), {})
+    assert stats["surface_totale_m2"] == 0
+    assert stats["par_categorie"][0]["surface_m2"] == 0
+
+
+def test_encode_refuses_nan():
+    with pytest.raises(ValueError):
+        api._encode({"distance_m": float("nan")})
+    assert json.loads(api._encode({"distance_m": 1.5})[0]) == {"distance_m": 1.5}
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    # handle() sans dataset : backend factice, cache de réponses neuf
+    monkeypatch.setattr(backend, "get_backend", lambda version=None: ZeroSurfaceBackend())
+    return api.ResponseCache()
+
+
+def test_etag_revalidation_follows_the_version(offline):
+    status, headers, body = api.handle("/stats", version="v1", cache=offline)
+    assert status == 200 and json.loads(body)["version"] == "v1"
+    etag = headers["ETag"]
+
+    status, headers, body = api.handle("/stats", {"If-None-Match": etag}, version="v1", cache=offline)
+    assert (status, body) == (304, b"")
+    assert headers["ETag"] == etag
+
+    # nouvelle version du dataset : l'ancien ETag ne vaut plus
+    status, headers, _ = api.handle("/stats", {"If-None-Match": etag}, version="v2", cache=offline)
+    assert status == 200 and headers["ETag"] != etag
+
+
+def test_gzip_only_when_accepted(offline):
+    status, headers, body = api.handle("/version", {"Accept-Encoding": "gzip, br"}, version="v1", cache=offline)
+    assert headers["Content-Encoding"] == "gzip"
+    plain = json.loads(gzip.decompress(body))
+
+    status, headers, body = api.handle("/version", version="v1", cache=offline)
+    assert "Content-Encoding" not in headers
+    assert json.loads(body) == plain
+
+    # petite réponse : jamais compressée
+    _, headers, _ = api.handle("/stats", {"Accept-Encoding": "gzip"}, version="v1", cache=offline)
+    assert "Content-Encoding" not in headers
+
+
+def test_response_cache_hit_on_normalized_query(offline):
+    _, first, _ = api.handle("/stats?categorie=Square,Jardin&annee_max=2000", version="v1", cache=offline)
+    assert (offline.hits, offline.misses) == (0, 1)
+    _, second, _ = api.handle(
+        "/stats?annee_max=2000&categorie=Jardin&categorie=Square", version="v1", cache=offline
+    )
+    assert (offline.hits, offline.misses) == (1, 1)
+    assert second["ETag"] == first["ETag"]
+    # même requête sur une autre version : nouvelle entrée
+    api.handle("/stats?categorie=Jardin,Square&annee_max=2000", version="v2", cache=offline)
+    assert offline.misses == 2
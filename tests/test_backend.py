@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+import backend
+import dataset
+
+
+@pytest.fixture
+def backends(tmp_path):
+    csv_path = tmp_path / dataset.DATA_FILE
+    pd.DataFrame({
+        "nom": ["A", "B", "C", "D", "E"],
+        "categorie": ["Jardin", "Jardin", "Square", "Square", None],
+        "code_postal": ["75001", "75002", "75002", "75002", "75003"],
+        "annee_ouverture": [1905, 1912, None, 1998, 2001],
+        "ouverture_24h": [True, False, True, True, False],
+        "surface_m2": [100.0, 200.0, None, 50.0, 10.0],
+        "geo_shape": [None] * 5,
+    }).to_csv(csv_path, sep=";", index=False)
+    db_path = tmp_path / backend.DB_FILE
+    backend.write_database(str(csv_path), str(db_path))
+    return {
+        "pandas": backend.PandasBackend(dataset.load_dataset(str(csv_path))),
+        "sqlite": backend.SqliteBackend(str(db_path)),
+    }
+
+
+@pytest.mark.parametrize("kind", ["pandas", "sqlite"])
+def test_group_count(backends, kind):
+    be = backends[kind]
+    counts = be.group_count(["arrondissement_affiche", "categorie"])
+    assert counts.to_dict("records") == [
+        {"arrondissement_affiche": "1er", "categorie": "Jardin", "nb": 1},
+        {"arrondissement_affiche": "2e", "categorie": "Jardin", "nb": 1},
+        {"arrondissement_affiche": "2e", "categorie": "Square", "nb": 2},
+    ]
+    years = be.group_count(["annee_ouverture"], categories=["Square"])
+    assert years.to_dict("records") == [{"annee_ouverture": 1998, "nb": 1}]
+    assert be.group_count(["colonne_absente"]) is None
+
+
+@pytest.mark.parametrize("kind", ["pandas", "sqlite"])
+def test_group_mean(backends, kind):
+    rates = backends[kind].group_mean(["categorie"], "ouverture_24h")
+    assert rates.to_dict("records") == [
+        {"categorie": "Jardin", "ouverture_24h": 0.5},
+        {"categorie": "Square", "ouverture_24h": 1.0},
+    ]
+
+
+def test_partition_with_several_labels_is_selected_for_each(tmp_path):
+    import partitions
+
+    # même code postal hors Paris : une ligne affichée par son code postal, l'autre par sa commune
+    csv_path = tmp_path / dataset.DATA_FILE
+    pd.DataFrame({
+        "nom": ["A", "B"],
+        "categorie": ["Bois", "Bois"],
+        "code_postal": ["94130", "94130"],
+        "commune": [None, "Nogent-sur-Marne"],
+        "geo_shape": [None, None],
+    }).to_csv(csv_path, sep=";", index=False)
+    parts_dir = tmp_path / partitions.PARTITIONS_SUBDIR
+    partitions.write_partitions(str(csv_path), str(parts_dir))
+
+    be = backend.PartitionedBackend(partitions.PartitionStore(str(parts_dir)))
+    assert be.select(["nom"], arrondissements=["Nogent-sur-Marne"])["nom"].tolist() == ["B"]
+    assert be.select(["nom"], arrondissements=["94130"])["nom"].tolist() == ["A"]
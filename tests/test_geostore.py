@@ -0,0 +1,20 @@
+import artifacts
+import geostore
+
+
+def square(x0):
+    return {"type": "Polygon", "coordinates": [[[x0, 48.85], [x0 + 0.001, 48.85], [x0 + 0.001, 48.851], [x0, 48.85]]]}
+
+
+def test_store_is_rejected_for_another_csv_with_the_same_row_count(tmp_path):
+    csv_path = tmp_path / "espaces.csv"
+    csv_path.write_text("nom\nA\nB\n", encoding="utf-8")
+    store_dir = str(tmp_path / geostore.GEOMETRY_SUBDIR)
+    geostore.write_store([square(2.35), square(2.36)], store_dir, source=artifacts.content_hash(csv_path))
+
+    store = geostore.get_store(store_dir, expected_features=2, csv_path=str(csv_path))
+    assert store is not None and len(store) == 2
+
+    # CSV reconstruit, même nombre de lignes : les géométries ne lui correspondent plus
+    csv_path.write_text("nom\nC\nD\n", encoding="utf-8")
+    assert geostore.get_store(store_dir, expected_features=2, csv_path=str(csv_path)) is None
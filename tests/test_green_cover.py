@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import geostore
+import green_cover
+
+# carré de côté side (m) près de Notre-Dame, décalé de (dx, dy) mètres
+LON0, LAT0 = 2.35, 48.85
+M_LON, M_LAT = green_cover.meters_per_degree(LAT0)
+
+
+def square(dx=0, dy=0, side=200):
+    x0, y0 = LON0 + dx / M_LON, LAT0 + dy / M_LAT
+    x1, y1 = x0 + side / M_LON, y0 + side / M_LAT
+    return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+
+
+def coverage(geometries, labels):
+    df = pd.DataFrame({"arrondissement_affiche": labels})
+    result = green_cover.compute_coverage(df, geostore.pack_geometries(geometries))
+    by_label = {s["arrondissement_affiche"]: s["surface_verte_m2"] for s in result["arrondissements"]}
+    return result, by_label
+
+
+def fake_result():
+    return {
+        "cells": np.zeros((2, 2), dtype=np.float32),
+        "grid": {},
+        "bounds": [],
+        "green_m2": 0.0,
+        "pixels": 0,
+        "arrondissements": [],
+    }
+
+
+def test_save_keeps_tmp_files_of_other_processes(tmp_path):
+    # raster terminé d'une ancienne version, et écritures en cours (autre process)
+    (tmp_path / "oldversion-abc.npz").write_bytes(b"")
+    (tmp_path / "oldversion-def.npz.tmp.npz").write_bytes(b"")
+    (tmp_path / "newversion-def.npz.tmp.npz").write_bytes(b"")
+
+    path = str(tmp_path / "newversion-abc.npz")
+    green_cover._save(path, fake_result(), b"png")
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "newversion-abc.npz",
+        "newversion-def.npz.tmp.npz",
+        "oldversion-def.npz.tmp.npz",
+    ]
+    result, png = green_cover._load(path)
+    assert png == b"png"
+
+
+def test_square_covered_area():
+    result, by_label = coverage([square()], ["5e"])
+    assert result["green_m2"] == pytest.approx(40000, rel=0.03)
+    assert by_label["5e"] == pytest.approx(40000, rel=0.03)
+    assert result["arrondissements"][0]["couverture_pct"] == pytest.approx(100 * 40000 / 2.54e6, rel=0.03)
+
+
+def test_overlapping_polygons_counted_once():
+    # deux carrés de 200 m décalés de 100 m : union = 60 000 m², pas 80 000
+    result, by_label = coverage([square(), square(dx=100), square(dx=1000)], ["5e", "5e", "6e"])
+    assert by_label["5e"] == pytest.approx(60000, rel=0.03)
+    assert by_label["6e"] == pytest.approx(40000, rel=0.03)
+    assert result["green_m2"] == pytest.approx(by_label["5e"] + by_label["6e"], abs=2)
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+import history
+
+
+def make_index():
+    df = pd.DataFrame(
+        {
+            "nom": ["Square A", "Square B", "Square C", "Square D"],
+            "ancien_nom": ["Vieux A", "Vieux B", "Vieux C", None],
+            "annee_ouverture": [1900, 1900, 1900, 1900],
+            # A : année de changement inconnue, B : renommé en 1950, C : en 2030
+            "annee_changement_nom": [np.nan, 1950, 2030, 1950],
+            "annee_renovation": [np.nan, np.nan, np.nan, np.nan],
+        },
+        index=[10, 11, 12, 13],
+    )
+    return history.HistoryIndex(df)
+
+
+def test_old_name_only_before_a_known_rename_year():
+    state = make_index().state(2025)
+    assert state["nom_epoque"].to_dict() == {10: "Square A", 11: "Square B", 12: "Vieux C", 13: "Square D"}
+    assert state["renomme_depuis"].to_dict() == {10: False, 11: False, 12: True, 13: False}
+
+
+def test_old_name_before_the_rename():
+    state = make_index().state(1920)
+    assert state["nom_epoque"].to_dict() == {10: "Square A", 11: "Vieux B", 12: "Vieux C", 13: "Square D"}
+    assert (state["nom_actuel"] == ["Square A", "Square B", "Square C", "Square D"]).all()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import geostore
+import overlaps
+
+# carré de côté ~100 m près de Notre-Dame, décalé de (dx, dy) mètres
+LON0, LAT0 = 2.35, 48.85
+M_LON = 111320 * np.cos(np.radians(LAT0))
+M_LAT = 111132
+
+
+def square(dx=0, dy=0, side=100):
+    x0, y0 = LON0 + dx / M_LON, LAT0 + dy / M_LAT
+    x1, y1 = x0 + side / M_LON, y0 + side / M_LAT
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+def metrics_and_graph(geometries):
+    arrays = geostore.pack_geometries(geometries)
+    metrics = geostore.feature_metrics(arrays)
+    bounds = np.column_stack([metrics[c] for c in ("bbox_lon_min", "bbox_lat_min", "bbox_lon_max", "bbox_lat_max")])
+    return metrics, overlaps.build_overlaps(arrays, bounds)
+
+
+def test_multipolygon_parts_overlapping_are_dissolved():
+    # deux parties de 100 x 100 m qui se recouvrent sur 50 x 100 m : union = 15 000 m²
+    multi = {"type": "MultiPolygon", "coordinates": [[square()], [square(dx=50)]]}
+    metrics, graph = metrics_and_graph([multi])
+
+    assert metrics["surface_geo_m2"][0] == pytest.approx(20000, rel=0.01)
+    assert graph["self_overlap"][0] == pytest.approx(5000, rel=0.05)
+    assert metrics["surface_geo_m2"][0] - graph["self_overlap"][0] == pytest.approx(15000, rel=0.02)
+    # une seule feature : aucun recouvrement entre espaces
+    assert len(graph["atom_areas"]) == 0
+
+
+def test_multipolygon_overlapping_another_feature_counts_once():
+    # le MultiPolygon ci-dessus (union de 0 à 150 m) + un carré identique à sa
+    # seconde partie, donc entièrement dedans : recouvrement de 100 x 100 m avec
+    # l'union, pas 150 x 100 m (somme des deux parties)
+    multi = {"type": "MultiPolygon", "coordinates": [[square()], [square(dx=50)]]}
+    other = {"type": "Polygon", "coordinates": [square(dx=50)]}
+    metrics, graph = metrics_and_graph([multi, other])
+
+    assert graph["edges"].tolist() == [[0, 1]]
+    assert graph["edge_areas"][0] == pytest.approx(10000, rel=0.05)
+    assert graph["self_overlap"][1] == 0
+
+
+def test_disjoint_multipolygon_has_no_self_overlap():
+    multi = {"type": "MultiPolygon", "coordinates": [[square()], [square(dx=200)]]}
+    metrics, graph = metrics_and_graph([multi])
+    assert graph["self_overlap"][0] == 0
+    assert metrics["surface_geo_m2"][0] == pytest.approx(20000, rel=0.01)
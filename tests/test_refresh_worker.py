@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import dataset
+import refresh_worker
+
+
+@pytest.fixture
+def releases(tmp_path, monkeypatch):
+    releases_dir = tmp_path / "releases"
+    releases_dir.mkdir()
+    monkeypatch.setattr(dataset, "RELEASES_DIR", str(releases_dir))
+    monkeypatch.setattr(dataset, "CURRENT_FILE", str(tmp_path / "current"))
+    monkeypatch.setattr(refresh_worker, "HISTORY_FILE", str(releases_dir / "history.json"))
+    return tmp_path
+
+
+def publish_fake(tmp_path, n):
+    build_dir = tmp_path / f"build-{n}"
+    build_dir.mkdir()
+    (build_dir / dataset.DATA_FILE).write_text(f"nom\nversion {n}\n", encoding="utf-8")
+    return refresh_worker.publish(str(build_dir))
+
+
+def test_rollback_never_targets_a_pruned_release(releases):
+    published = [publish_fake(releases, n) for n in range(4)]
+    # seules les KEEP_RELEASES dernières restent sur disque et dans l'historique
+    assert refresh_worker.read_history() == published[-refresh_worker.KEEP_RELEASES:]
+    assert not os.path.exists(os.path.join(dataset.RELEASES_DIR, published[0]))
+
+    assert refresh_worker.rollback() == published[2]
+    assert refresh_worker.rollback() == published[1]
+    with pytest.raises(RuntimeError):
+        refresh_worker.rollback()
+    assert dataset.current_release() == published[1]
+
+
+def test_rollback_cli_without_previous_release_exits_1(releases, capsys):
+    publish_fake(releases, 0)
+    assert refresh_worker.main(["--rollback"]) == 1
+    assert "Retour arrière impossible" in capsys.readouterr().out
+
+
+def test_artifacts_dir_raises_when_current_release_is_missing(releases):
+    release = publish_fake(releases, 0)
+    assert dataset.artifacts_dir() == os.path.join(dataset.RELEASES_DIR, release)
+
+    refresh_worker.set_current("deadbeef0000")
+    with pytest.raises(FileNotFoundError):
+        dataset.artifacts_dir()
+    # une version calculée sur src/ (sans release) reste servie depuis src/
+    assert dataset.artifacts_dir("0123456789ab") == dataset.DATA_DIR
+
+
+def test_a_failing_drop_does_not_block_the_others(releases, monkeypatch):
+    incoming = releases / "incoming"
+    incoming.mkdir()
+    monkeypatch.setattr(refresh_worker, "DONE_DIR", str(incoming / "done"))
+    monkeypatch.setattr(refresh_worker, "FAILED_DIR", str(incoming / "failed"))
+    (incoming / "a.csv").write_text("a")
+    (incoming / "b.csv").write_text("b")
+
+    worker = refresh_worker.RefreshWorker(incoming_dir=str(incoming))
+    processed = []
+
+    def process(path):
+        processed.append(os.path.basename(path))
+        if path.endswith("a.csv"):
+            raise OSError("disque plein")
+        return "release"
+
+    monkeypatch.setattr(worker, "process", process)
+    worker.poll()
+    assert worker.poll() == [None, "release"]
+    assert processed == ["a.csv", "b.csv"]
+    worker.pool.shutdown()
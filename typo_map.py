@@ -0,0 +1,67 @@
+import backend
+import dataset
+
+# Couche GeoJSON de la carte typologique (app.py). La carte sans filtre, la
+# première affichée, est gardée par version dans le process : serve.py la
+# construit au démarrage et la première session la trouve prête.
+CATEGORY_COLORS = {
+    "Bois": [0, 100, 0, 120],
+    "Parc": [46, 204, 113, 120],
+    "Square": [52, 152, 219, 120],
+    "Jardin": [241, 196, 15, 120],
+    "Jardin partage": [230, 126, 34, 120],
+    "Pelouse": [39, 174, 96, 120],
+    "Mail": [142, 68, 173, 120],
+    "Promenade": [26, 188, 156, 120],
+    "Terrain de boules": [192, 57, 43, 120],
+    "Forêt urbaine": [0, 128, 0, 120],
+    "Ile": [52, 73, 94, 120],
+    "Cimetière": [149, 165, 166, 120],
+}
+
+# filtres de la carte quand aucun widget n'a été touché
+DEFAULT_FILTERS = {
+    "categories": [],
+    "arrondissements": [],
+    "ouverture_24h": None,
+    "presence_cloture": None,
+}
+
+
+def build_geojson(be, filters):
+    geo_df = be.select(
+        ["nom", "categorie", "ouverture_24h", "presence_cloture", "geometry"],
+        has_geometry=True,
+        **filters,
+    )
+
+    features = []
+    for _, row in geo_df.iterrows():
+        fill = CATEGORY_COLORS.get(row["categorie"], [127, 140, 141, 120])
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "nom": row["nom"],
+                "categorie": row["categorie"],
+                "ouverture_24h": "Oui" if row.get("ouverture_24h") else "Non",
+                "presence_cloture": "Oui" if row.get("presence_cloture") else "Non",
+                "fill_color": fill,
+            },
+            "geometry": row["geometry"],
+        })
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+_defaults = {}
+
+
+def get_geojson(be, filters=None):
+    filters = DEFAULT_FILTERS if filters is None else filters
+    if filters != DEFAULT_FILTERS:
+        return build_geojson(be, filters)
+    return dataset.get_or_load(_defaults, be.version, lambda: build_geojson(be, DEFAULT_FILTERS))
+
+
+def warm(version):
+    get_geojson(backend.get_backend(version=version))
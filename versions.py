@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+import time
+
+import artifacts
+import backend
+import dataset
+import geostore
+import overlaps
+import partitions
+import search
+
+# Version du dataset = hash du contenu du CSV normalisé + taille/date des
+# artefacts dérivés. Elle sert de clé à tous les caches (dataset, backends,
+# couches de carte, stats, exports) : un nouveau build publie une nouvelle
+# version sans redémarrer l'app, et chaque rerun reste sur celle qu'il a lue.
+RELOAD_INTERVAL_S = float(os.environ.get("EV_RELOAD_INTERVAL", "5"))
+
+
+def artifact_paths(base_dir=dataset.DATA_DIR):
+    return [
+        os.path.join(base_dir, dataset.DATA_FILE),
+        os.path.join(base_dir, backend.DB_FILE),
+        os.path.join(base_dir, partitions.PARTITIONS_SUBDIR, partitions.INDEX_FILE),
+        os.path.join(base_dir, geostore.GEOMETRY_SUBDIR, geostore.META_FILE),
+        os.path.join(base_dir, overlaps.OVERLAPS_SUBDIR, overlaps.META_FILE),
+        os.path.join(base_dir, search.SEARCH_SUBDIR, search.META_FILE),
+    ]
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+# signature (taille/date de chaque artefact) -> version : le CSV n'est
+# re-hashé que quand un fichier a bougé
+_versions = {}
+
+
+def dataset_version():
+    # release publiée par refresh_worker.py : son nom est déjà un hash du contenu
+    release = dataset.current_release()
+    if release:
+        return release
+
+    paths = artifact_paths()
+    signature = tuple(_stat(p) for p in paths)
+    if signature not in _versions:
+        h = hashlib.sha256(artifacts.content_hash(paths[0]).encode())
+        h.update(repr(signature[1:]).encode())
+        _versions.clear()
+        _versions[signature] = h.hexdigest()[:12]
+    return _versions[signature]
+
+
+def warm(version):
+    # charge le backend (et donc le dataset en mode pandas) de cette version
+    backend.get_backend(version=version)
+
+
+class DatasetWatcher:
+    # Surveille les artefacts et bascule sur une nouvelle version une fois
+    # celle-ci chargée : les sessions ne voient jamais une version à moitié
+    # prête, et un seul chargement est fait par process (pas de ruée).
+    def __init__(self, interval=RELOAD_INTERVAL_S):
+        self.interval = interval
+        self.current = dataset_version()
+        warm(self.current)
+        self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+
+    def check(self):
+        try:
+            version = dataset_version()
+            if version != self.current:
+                warm(version)
+                # simple affectation : atomique pour les threads des sessions
+                self.current = version
+                print(f"🔄 Nouvelle version du dataset : {version}")
+        except Exception as e:
+            # build en cours (fichier absent ou incomplet) : on réessaiera
+            print(f"⚠️ Rechargement du dataset impossible : {e}")
+        return self.current
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
+
+
+_lock = threading.Lock()
+_watcher = None
+
+
+def get_watcher():
+    global _watcher
+    with _lock:
+        if _watcher is None:
+            _watcher = DatasetWatcher()
+        return _watcher
@@ -0,0 +1,110 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+
+# budget total du démarrage à froid (imports + chargement des données), en secondes
+STARTUP_BUDGET_S = float(os.environ.get("EV_STARTUP_BUDGET", "5"))
+
+# modules lourds chargés au premier affichage
+HEAVY_IMPORTS = ["pandas", "pydeck", "altair"]
+
+
+def prewarm(imports=HEAVY_IMPORTS):
+    # importe les modules lourds puis charge le dataset partagé, ses index et le backend,
+    # en mesurant chaque étape. Les timings d'import ne sont significatifs
+    # que dans un process neuf (sinon le module est déjà dans sys.modules).
+    timings = {}
+    for name in imports:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[f"import {name}"] = time.perf_counter() - start
+
+    import backend
+    import dataset
+    import versions
+
+    with dataset.timed(timings, "version (hash)"):
+        version = versions.dataset_version()
+    if backend.BACKEND == "pandas":
+        dataset.get_dataset(version=version, timings=timings)
+    with dataset.timed(timings, f"backend {backend.BACKEND}"):
+        be = backend.get_backend(version=version)
+
+    # index et couche par défaut calculés au premier affichage de l'app
+    with dataset.timed(timings, "index de recherche"):
+        import search
+
+        search.get_index(os.path.join(dataset.artifacts_dir(version), search.SEARCH_SUBDIR))
+    with dataset.timed(timings, "index historique"):
+        import history
+
+        history.get_history(be)
+    with dataset.timed(timings, "carte typologique"):
+        import typo_map
+
+        typo_map.warm(version)
+
+    # variantes WebP : ~5 s au premier démarrage d'un déploiement neuf
+    # (python eras.py au déploiement pour ne pas les payer ici)
+    with dataset.timed(timings, "variantes WebP"):
+        import eras
+
+        eras.build_variants()
+    with dataset.timed(timings, "images d'époque"):
+        eras.warm()
+    # démarre la surveillance des nouveaux builds (version déjà chargée)
+    versions.get_watcher()
+    return timings
+
+
+def check_budget(timings, budget=STARTUP_BUDGET_S, component_budgets=None):
+    errors = []
+    total = sum(timings.values())
+    if budget is not None and total > budget:
+        errors.append(f"total {total:.2f}s > budget {budget:.2f}s")
+    for name, limit in (component_budgets or {}).items():
+        if name in timings and timings[name] > limit:
+            errors.append(f"{name} {timings[name]:.2f}s > budget {limit:.2f}s")
+    return errors
+
+
+def print_report(timings):
+    width = max(len(name) for name in timings) if timings else 0
+    print("=== Démarrage à froid ===")
+    for name, seconds in timings.items():
+        print(f"{name:<{width}}  {seconds * 1000:8.1f} ms")
+    print(f"{'total':<{width}}  {sum(timings.values()) * 1000:8.1f} ms")
+
+
+def parse_component_budget(value):
+    name, _, seconds = value.rpartition("=")
+    if not name:
+        raise argparse.ArgumentTypeError("format attendu : NOM=SECONDES")
+    return name, float(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid de l'app")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_S,
+                        help="budget total en secondes (défaut : $EV_STARTUP_BUDGET ou 5)")
+    parser.add_argument("--component-budget", type=parse_component_budget, action="append",
+                        default=[], metavar="NOM=SECONDES",
+                        help="budget d'une étape, ex. 'lecture CSV=1.5' (répétable)")
+    args = parser.parse_args(argv)
+
+    timings = prewarm()
+    print_report(timings)
+
+    errors = check_budget(timings, args.budget, dict(args.component_budget))
+    for err in errors:
+        print(f"❌ {err}")
+    if errors:
+        return 1
+    print("✅ Budget respecté")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())